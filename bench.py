@@ -0,0 +1,278 @@
+import gc
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import datetime
+import tempfile
+
+import numpy
+
+from lib.trail import Trail
+from lib.compiled import compile_trail, CompiledTrail
+from lib.party import Party
+from lib.world import World
+from lib.runner import run_trials
+from lib.rng import streams
+
+START = datetime.datetime(2016, 8, 15, 6, 0)
+SEED = 20161112
+
+DATA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), 'data'))
+CALIBRATION = 'calibration loop'
+
+BELLY_RIVER = {'trail file': os.path.join(DATA_PATH, 'belly_river_trail.json'),
+               'terrain file': os.path.join(DATA_PATH, 'belly_river_terrain.json'),
+               'party file': os.path.join(DATA_PATH, 'belly_river_party.json')}
+
+
+def write_synthetic_trail(directory, miles=3000, section_miles=3, river_every=150, town_every=400,
+                          bear_probability=0.003125, bear_severity=(80, 10)):
+    """
+    Write a long trail and its terrain in the same format as the bundled data: short terrain sections with varied
+    elevation gain and a bear danger, rivers and towns spread along it, and camps everywhere else.
+    """
+    rng = numpy.random.RandomState(SEED)
+
+    trail = [{'name': 'trailhead', 'mile marker': 0, 'kind': 'camp', 'add actions': [], 'properties': {}}]
+    river = {'flood stage': 'spring', 'flood width': [300, 100], 'flood depth': [3, 1],
+             'low stage': 'fall', 'low width': [200, 50], 'low depth': [1, 0.5]}
+    for mm in range(1, miles + 1):
+        if mm == miles:
+            trail.append({'name': 'terminus', 'mile marker': mm, 'kind': 'camp', 'add actions': [], 'properties': {}})
+        elif mm % town_every == 0:
+            trail.append({'name': 'town ' + str(mm), 'mile marker': mm, 'kind': 'town', 'add actions': ['shop'],
+                          'properties': {}})
+        elif mm % river_every == 0:
+            trail.append({'name': 'river ' + str(mm), 'mile marker': mm, 'kind': 'river', 'add actions': ['ford'],
+                          'properties': {'river': river}})
+
+    terrain = list()
+    for start in range(0, miles, section_miles):
+        terrain.append({'tpye': 'grass',
+                        'trail section': [start, min(start + section_miles, miles)],
+                        'surface speed modifier': 1.0,
+                        'elevation gain per mile': int(rng.randint(-200, 400)),
+                        'dangers': [{'name': 'bear attack', 'probability': bear_probability,
+                                     'severity': list(bear_severity),
+                                     'travel delay': 2, 'affliction': False}]})
+
+    files = {'trail file': os.path.join(directory, 'synthetic_trail.json'),
+             'terrain file': os.path.join(directory, 'synthetic_terrain.json'),
+             'party file': BELLY_RIVER['party file']}
+    with open(files['trail file'], 'w') as trail_file:
+        json.dump(trail, trail_file)
+    with open(files['terrain file'], 'w') as terrain_file:
+        json.dump(terrain, terrain_file)
+
+    return files
+
+
+def seed():
+    streams.seed(SEED)
+    numpy.random.seed(SEED)
+    random.seed(SEED)
+
+
+def best_times(benchmarks, repeat=15, min_time=0.1):
+    """
+    Best time per operation of each benchmark over repeat rounds. benchmarks maps name --> (function, operations per
+    call); a round calls each function in turn until at least min_time has passed.
+
+    A machine's speed can drift by tens of percent over seconds, so the rounds of every benchmark are interleaved: each
+    benchmark's best round then comes from the fastest stretch of the whole run, not from whatever stretch its own
+    rounds happened to fall in. Time is the process's CPU time, with the garbage collector off (as timeit does).
+    """
+    best = dict()
+    collecting = gc.isenabled()
+    for r in range(repeat):
+        for name in sorted(benchmarks):
+            function, operations = benchmarks[name]
+            seed()
+            calls = 0
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.clock()
+                while True:
+                    function()
+                    calls += 1
+                    elapsed = time.clock() - start
+                    if elapsed >= min_time:
+                        break
+            finally:
+                if collecting:
+                    gc.enable()
+            per_operation = elapsed / calls / operations
+            best[name] = min(best.get(name, per_operation), per_operation)
+
+    return best
+
+
+def bench_calibration(loops=20000):
+    # plain interpreter work, none of it the simulation's: how fast the machine is running
+    def spin():
+        total = 0
+        for i in xrange(loops):
+            total += i
+
+    return spin, loops
+
+
+def bench_trail_construction(files):
+    return lambda: Trail(START, files['trail file'], files['terrain file']), 1
+
+
+def bench_compiled_trail_load(files, directory):
+    file_name = os.path.join(directory, os.path.basename(files['trail file']) + '.compiled')
+    compile_trail(files['trail file'], files['terrain file'], file_name)
+    return lambda: CompiledTrail(START, file_name), 1
+
+
+def bench_world_update(files, steps=2000):
+    # World.update, over whole trials run back to back
+    trail = Trail(START, files['trail file'], files['terrain file'])
+
+    def run():
+        done = 0
+        while done < steps:
+            view = trail.trial_view(START)
+            world = World(START, Party(START, files['party file'], view), view)
+            while world.party.condition not in ('arrived', 'dead') and done < steps:
+                world.update('greatest need')
+                done += 1
+
+    return run, steps
+
+
+def new_party(files, at_river=False):
+    trail = Trail(START, files['trail file'], files['terrain file'])
+    party = Party(START, files['party file'], trail)
+    if at_river:
+        party.current_stop = trail.path[trail.river_mile_markers[0]]
+    return party, trail
+
+
+def bench_decide_greatest_need(files, at_river=False):
+    party, trail = new_party(files, at_river)
+    return lambda: party.decide_greatest_need(trail, 0.0), 1
+
+
+def bench_update_food(files, amount=500):
+    party, trail = new_party(files)
+
+    def move_food():
+        party.update_food(amount)
+        party.update_food(-amount)
+
+    return move_food, 2
+
+
+def bench_river_state(files, days=60):
+    trail = Trail(START, files['trail file'], files['terrain file'])
+    river = trail.path[trail.river_mile_markers[0]]
+    first_day = START.toordinal()
+    queries = [first_day + i // 4 for i in range(4 * days)]
+
+    def query():
+        for day in queries:
+            river.river_state(day)
+
+    return query, len(queries)
+
+
+def bench_trials(files, trials=20):
+    scenario = dict(files, strategy='greatest need')
+    scenario['start datetime'] = START
+    return lambda: run_trials(scenario, trials, SEED), trials
+
+
+def run_benchmarks(synthetic, directory, repeat=15, min_time=0.1):
+    # name --> seconds per operation
+    benchmarks = {CALIBRATION: bench_calibration()}
+    for label, files in [('belly river', BELLY_RIVER), ('synthetic', synthetic)]:
+        benchmarks[label + ': Trail construction'] = bench_trail_construction(files)
+        benchmarks[label + ': CompiledTrail load'] = bench_compiled_trail_load(files, directory)
+        benchmarks[label + ': World.update'] = bench_world_update(files)
+        benchmarks[label + ': Party.decide_greatest_need (camp)'] = bench_decide_greatest_need(files)
+        benchmarks[label + ': Party.decide_greatest_need (river)'] = bench_decide_greatest_need(files, at_river=True)
+        benchmarks[label + ': Party.update_food'] = bench_update_food(files)
+        benchmarks[label + ': River.river_state'] = bench_river_state(files)
+        benchmarks[label + ': run_trials per trial'] = bench_trials(files)
+
+    return best_times(benchmarks, repeat, min_time)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print each benchmark as operations per second, against the baseline if there is one. Changes are measured after
+    scaling the baseline by how much faster or slower the machine runs the calibration loop than it did then, which
+    takes out drift of the whole machine between the two runs.
+
+    Returns: names of the benchmarks that are more than tolerance slower than the baseline
+    -------
+    """
+    machine = 1.0
+    if CALIBRATION in results and CALIBRATION in baseline:
+        machine = results[CALIBRATION] / baseline[CALIBRATION]
+        print 'machine speed against the baseline: %+.1f%%' % (100 * (1.0 / machine - 1.0))
+
+    regressions = list()
+    print '%-55s %14s %14s %8s' % ('benchmark', 'ops/s', 'baseline', 'change')
+    for name in sorted(results):
+        rate = 1.0 / results[name]
+        if name == CALIBRATION:
+            print '%-55s %14.1f %14s %8s' % (name, rate, '-', '')
+        elif name in baseline:
+            base_rate = 1.0 / baseline[name]
+            change = rate * machine / base_rate - 1.0
+            flag = ''
+            if change < -tolerance:
+                flag = '  REGRESSION'
+                regressions.append(name)
+            print '%-55s %14.1f %14.1f %+7.1f%%%s' % (name, rate, base_rate, 100 * change, flag)
+        else:
+            print '%-55s %14.1f %14s %8s' % (name, rate, '-', '')
+
+    return regressions
+
+
+def main(args):
+    directory = tempfile.mkdtemp(prefix='tort_bench_')
+    try:
+        synthetic = write_synthetic_trail(directory, miles=args.miles)
+        results = run_benchmarks(synthetic, directory, args.repeat, args.min_time)
+    finally:
+        shutil.rmtree(directory)
+
+    baseline = dict()
+    if args.baseline is not None and os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)['seconds per operation']
+
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump({'seconds per operation': results, 'miles': args.miles, 'seed': SEED}, baseline_file,
+                      indent=2, sort_keys=True)
+
+    if regressions:
+        print len(regressions), 'benchmark(s) regressed by more than', str(int(100 * args.tolerance)) + '%'
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", default='bench_baseline.json', help="compare against this baseline file")
+    parser.add_argument("--save-baseline", default=None, help="save these results as a baseline file")
+    # best-of-15 runs of the same tree against each other have differed by up to 38% on a noisy machine
+    parser.add_argument("--tolerance", type=float, default=0.4, help="allowed slowdown before flagging a regression")
+    parser.add_argument("--repeat", type=int, default=15, help="rounds of each benchmark; the best round counts")
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds each benchmark runs for in a round")
+    parser.add_argument("--miles", type=int, default=3000, help="length of the synthetic trail")
+    args = parser.parse_args()
+    main(args)
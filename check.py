@@ -0,0 +1,195 @@
+import sys
+import math
+import shutil
+import argparse
+import tempfile
+
+import numpy
+
+from lib.util import round_robin_add, round_robin_take
+from lib.batch import round_robin_removal
+from lib.runner import run_trial, run_batch
+from lib.stats import RunningStats
+from bench import write_synthetic_trail, START
+
+SEED = 20161112
+
+
+def pound_at_a_time_add(count, amount):
+    # the original Party.update_food loop, handing out food a pound at a time
+    shares = [0] * count
+    delta = 0
+    while delta < amount:
+        for i in range(count):
+            shares[i] += 1
+            delta += 1
+            if delta == amount:
+                break
+
+    return shares
+
+
+def pound_at_a_time_take(inventory, amount):
+    # the original Party.update_food loop, taking food a pound at a time and skipping members who have none
+    food = list(inventory)
+    delta = 0
+    while delta < amount:
+        for i in range(len(food)):
+            if food[i] > 0:
+                food[i] -= 1
+                delta += 1
+            if delta == amount:
+                break
+
+    return [before - after for before, after in zip(inventory, food)]
+
+
+def pound_at_a_time_feed(inventory, needs):
+    # the original Party.feed: each member in turn takes a ration out of what is left
+    food = list(inventory)
+    for need in needs:
+        ration = min(need, sum(food))
+        taken = pound_at_a_time_take(food, ration)
+        food = [f - t for f, t in zip(food, taken)]
+
+    return food
+
+
+def check_round_robin(cases=2000):
+    """
+    The closed forms (util.round_robin_add, util.round_robin_take, batch.round_robin_removal) against the pound at a time
+    loops they replaced, on whole pounds, where the loops terminate.
+
+    Returns: list of failure descriptions
+    -------
+    """
+    rng = numpy.random.RandomState(SEED)
+    failures = list()
+    for case in range(cases):
+        count = int(rng.randint(1, 7))
+        inventory = [int(f) for f in rng.randint(0, 25, size=count)]
+        amount = int(rng.randint(0, sum(inventory) + 1))
+        needs = [int(n) for n in rng.randint(0, 10, size=count)]
+
+        shares = round_robin_add(count, amount)
+        if shares != pound_at_a_time_add(count, amount):
+            failures.append('round_robin_add(%d, %d) = %s' % (count, amount, shares))
+
+        taken = round_robin_take(inventory, amount)
+        if taken != pound_at_a_time_take(inventory, amount):
+            failures.append('round_robin_take(%s, %d) = %s' % (inventory, amount, taken))
+
+        removed = round_robin_removal(numpy.array([inventory], dtype=float), numpy.array([amount], dtype=float),
+                                      numpy.ones((1, count), dtype=bool))[0].tolist()
+        if removed != pound_at_a_time_take(inventory, amount):
+            failures.append('round_robin_removal(%s, %d) = %s' % (inventory, amount, removed))
+
+        # Party.feed takes one ration per member, each its own round robin
+        food = list(inventory)
+        for need in needs:
+            taken = round_robin_take(food, min(need, sum(food)))
+            food = [f - t for f, t in zip(food, taken)]
+        if food != pound_at_a_time_feed(inventory, needs):
+            failures.append('feeding %s to %s leaves %s' % (needs, inventory, food))
+
+    return failures
+
+
+def compare_means(stats, labels, sigmas):
+    # the two sets of running statistics' means, to within sigmas standard errors of their difference
+    failures = list()
+    first, second = stats
+    for key in sorted(first):
+        a, b = first[key], second[key]
+        error = math.sqrt(a.variance() / a.count + b.variance() / b.count)
+        if abs(b.mean - a.mean) > sigmas * error:
+            failures.append('mean %s: %s %.4g, %s %.4g (standard error of the difference %.2g)' %
+                            (key, labels[0], a.mean, labels[1], b.mean, error))
+
+    return failures
+
+
+def check_leap(trials=4000, seed=1, sigmas=4.0):
+    """
+    Event-driven travel (Party.leap) against stepping mile by mile, on a trail where dangers strike often enough for the
+    leaps to be cut short by them and by deaths. The two don't draw the same random numbers, so their means are compared
+    to within sigmas standard errors of the difference.
+
+    Returns: list of failure descriptions
+    -------
+    """
+    directory = tempfile.mkdtemp(prefix='tort_check_')
+    try:
+        files = write_synthetic_trail(directory, miles=400, bear_probability=0.3, bear_severity=(1, 0.5))
+        stats = dict()
+        for event_driven in (False, True):
+            scenario = dict(files, strategy='greatest need')
+            scenario['start datetime'] = START
+            scenario['event driven'] = event_driven
+            stats[event_driven] = dict([(key, RunningStats()) for key in ('bear attacks', 'travel time', 'survivors')])
+            for t in xrange(trials):
+                result = run_trial(scenario, seed, t)
+                for key, s in stats[event_driven].iteritems():
+                    s.push(result[key])
+    finally:
+        shutil.rmtree(directory)
+
+    return compare_means((stats[False], stats[True]), ('stepping', 'leaping'), sigmas)
+
+
+def check_batch(trials=4000, seed=1, sigmas=4.0):
+    """
+    The batch engine (batch.BatchSimulation) against the scalar one (World), on a trail with rivers to ford and dangers
+    that wound and kill. The two don't draw the same random numbers, so their means are compared to within sigmas
+    standard errors of the difference.
+
+    Returns: list of failure descriptions
+    -------
+    """
+    directory = tempfile.mkdtemp(prefix='tort_check_')
+    try:
+        files = write_synthetic_trail(directory, miles=60, river_every=20, bear_probability=0.05,
+                                       bear_severity=(40, 15))
+        scenario = dict(files, strategy='greatest need')
+        scenario['start datetime'] = START
+        keys = ('bear attacks', 'travel time', 'survivors')
+
+        scalar = dict([(key, RunningStats()) for key in keys])
+        for t in xrange(trials):
+            result = run_trial(scenario, seed, t)
+            for key, s in scalar.iteritems():
+                s.push(result[key])
+
+        batch = dict([(key, RunningStats()) for key in keys])
+        result = run_batch(scenario, trials, seed, 0)
+        for key, s in batch.iteritems():
+            s.push_many([float(value) for value in result[key]])
+    finally:
+        shutil.rmtree(directory)
+
+    return compare_means((scalar, batch), ('scalar', 'batch'), sigmas)
+
+
+CHECKS = {'round robin': check_round_robin,
+          'leap': check_leap,
+          'batch': check_batch}
+
+
+def main(args):
+    failed = 0
+    for name in args.check or sorted(CHECKS):
+        failures = CHECKS[name]()
+        print '%-40s %s' % (name, 'ok' if not failures else str(len(failures)) + ' failure(s)')
+        for failure in failures[:10]:
+            print '    ' + failure
+        failed += len(failures) > 0
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="check fast paths against the simple code they replace")
+    parser.add_argument("--check", action='append', choices=sorted(CHECKS), help="run only this check (repeatable)")
+    args = parser.parse_args()
+    main(args)
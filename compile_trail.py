@@ -0,0 +1,12 @@
+import argparse
+from lib.compiled import compile_trail
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="compile a trail and its terrain into a binary artifact that "
+                                                 "main.py --compiled-trail memory-maps")
+    parser.add_argument("trail_file", help="trail JSON file")
+    parser.add_argument("terrain_file", help="terrain JSON file")
+    parser.add_argument("output", help="artifact to write; its header goes to OUTPUT.json")
+    args = parser.parse_args()
+    compile_trail(args.trail_file, args.terrain_file, args.output)
@@ -1,7 +1,14 @@
-class Affliction():
+# every member carries these afflictions, at fixed positions in Member.severity
+HUNGER, THIRST, FATIGUE = 0, 1, 2
+BASE_AFFLICTIONS = ('hunger', 'thirst', 'fatigue')
+
+
+class Affliction(object):
     """
     Defines a member of the travelling party.
     """
+    __slots__ = ('name', 'severity')
+
     def __init__(self, affliciton_def=None):
         assert affliciton_def is not None, 'ERROR - you need to provide an affliction definition dictionary.'
 
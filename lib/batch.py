@@ -0,0 +1,477 @@
+import copy
+import json
+
+import numpy
+
+from lib.member import Member, HUNGER_RATE, THIRST_RATE, FATIGUE_RATE
+from lib.util import gamma_parameters, added_distance
+from lib.clock import Calendar
+
+# decisions the 'greatest need' strategy can make at a stop, from the actions that have a utility
+TRAVEL, FORD, CHOOSE, NO_ACTION = 0, 1, 2, 3
+
+PACE_MODIFIERS = {'normal': 1.0, 'easy': 0.75, 'hard': 1.25}
+
+SEASONS = ['spring', 'summer', 'fall', 'winter']
+
+# the strategies the batch engine implements
+BATCH_STRATEGIES = ['greatest need']
+
+
+class BatchSimulation():
+    """
+    Simulates many independent parties in lockstep, with the party state held in NumPy arrays instead of Party and
+    Member objects. Every party starts from the same party file and travels the same trail, but has its own river
+    histories. One call to step() applies one World.update to every party still on the trail, following the rules of
+    Party.travel, Party.ford, Party.party_travel_time, Member.update_health and Member.update_weariness.
+
+    Array shapes: N parties, M members per party, K afflictions per member.
+    """
+    def __init__(self, date_and_time, party_file_name=None, trail=None, parties=1000, strategy='greatest need'):
+        if party_file_name is not None:
+            with open(party_file_name, 'r') as party_file:
+                party_data = json.load(party_file)
+        else:
+            raise ValueError('ERROR - party config file required to initialize party.')
+
+        if trail is None:
+            raise ValueError('ERROR - trail object required to initialize party.')
+
+        if strategy not in BATCH_STRATEGIES:
+            raise ValueError('ERROR - requested strategy is not implemented in the batch engine: ' + str(strategy))
+
+        self.start_datetime = date_and_time
+        self.calendar = Calendar(date_and_time)
+        self.trail = trail
+        self.parties = parties
+        self.pace = 'normal'
+
+        self.initialize_trail_tables()
+        self.initialize_members(party_data['members'])
+
+        # what each member died of, as an index into causes (-1 while alive); dangers come first, in the same order as
+        # danger_names
+        self.causes = list(self.danger_names)
+        for name in self.affliction_names + ['unknown']:
+            if name not in self.causes:
+                self.causes.append(name)
+        self.affliction_cause = numpy.array([self.causes.index(name) for name in self.affliction_names])
+        self.cause_of_death = numpy.empty(self.health.shape, dtype=int)
+        self.cause_of_death.fill(-1)
+        self.cause_of_death[~self.alive] = self.causes.index('unknown')
+
+        n = self.parties
+        self.mile_marker = numpy.empty(n, dtype=int)
+        self.mile_marker.fill(trail.first_mile_marker)
+        self.destination = trail.last_mile_marker
+        # hours since the start, like World.hours
+        self.clock = numpy.zeros(n)
+
+        self.event_counter = {'bear attack': numpy.zeros(n, dtype=int),
+                              'failed to ford': numpy.zeros(n, dtype=int)}
+
+        # each party gets its own copy of a river the first time it needs one
+        self.rivers = dict([(mm, [None] * n) for mm in trail.river_mile_markers])
+
+        self.update_condition()
+
+
+    def initialize_trail_tables(self):
+        # per-mile arrays, indexed by mile marker - first mile marker
+        trail = self.trail
+        miles = trail.last_mile_marker - trail.first_mile_marker + 1
+
+        self.decision = numpy.empty(miles, dtype=int)
+        self.distance = numpy.ones(miles)
+        self.surface_modifier = numpy.ones(miles)
+        self.season_modifier = numpy.ones((miles, len(SEASONS)))
+
+        self.danger_names = list()
+        self.affliction_names = ['hunger', 'thirst', 'fatigue']
+        dangers_per_mile = list()
+
+        for i in range(miles):
+            # described without building the camps between the trail's stops (trail.LazyPath)
+            mile_marker = trail.first_mile_marker + i
+            properties = trail.path.properties(mile_marker)
+
+            actions = trail.path.actions(mile_marker).intersection(['travel', 'ford', 'caulk'])
+            if 'caulk' in actions:
+                raise ValueError('ERROR - the batch engine cannot caulk: ' + trail.path[mile_marker].name)
+            elif actions == set(['travel']):
+                self.decision[i] = TRAVEL
+            elif actions == set(['ford']):
+                self.decision[i] = FORD
+            elif actions:
+                self.decision[i] = CHOOSE
+            else:
+                self.decision[i] = NO_ACTION
+
+            elevation_gain = properties.get('elevation gain per mile')
+            self.distance[i] = 1.0 + added_distance(elevation_gain)
+            self.surface_modifier[i] = properties.get('surface speed modifier', 1.0)
+
+            travel_speeds = properties.get('travel speed modifier')
+            if travel_speeds is not None:
+                self.season_modifier[i] = [travel_speeds[season] for season in SEASONS]
+
+            dangers = properties.get('dangers', list())
+            for danger in dangers:
+                if danger['name'] not in self.danger_names:
+                    self.danger_names.append(danger['name'])
+                if danger['affliction'] and danger['name'] not in self.affliction_names:
+                    self.affliction_names.append(danger['name'])
+            dangers_per_mile.append(dangers)
+
+        self.bear_attack = self.danger_names.index('bear attack') if 'bear attack' in self.danger_names else -1
+
+        # dangers padded out to the same number at every mile, with zero probability
+        d = max([len(mile_dangers) for mile_dangers in dangers_per_mile] + [0])
+        self.danger_probability = numpy.zeros((miles, d))
+        # gamma (shape, scale) of each danger's severity
+        self.danger_severity = numpy.ones((miles, d, 2))
+        self.danger_delay = numpy.zeros((miles, d))
+        self.danger_name = numpy.zeros((miles, d), dtype=int)
+        # affliction index if the danger is an affliction, else -1
+        self.danger_affliction = numpy.empty((miles, d), dtype=int)
+        self.danger_affliction.fill(-1)
+
+        for i, dangers in enumerate(dangers_per_mile):
+            for j, danger in enumerate(dangers):
+                self.danger_probability[i, j] = danger['probability']
+                self.danger_severity[i, j] = gamma_parameters(*danger['severity'])
+                self.danger_delay[i, j] = danger['travel delay']
+                self.danger_name[i, j] = self.danger_names.index(danger['name'])
+                if danger['affliction']:
+                    self.danger_affliction[i, j] = self.affliction_names.index(danger['name'])
+
+
+    def initialize_members(self, member_defs):
+        # parse each definition the same way the scalar engine does
+        members = [Member(member_def) for member_def in member_defs]
+
+        for member in members:
+            for name in member.affliction_index:
+                if name not in self.affliction_names:
+                    self.affliction_names.append(name)
+
+        n, m, k = self.parties, len(members), len(self.affliction_names)
+
+        self.base_speed = numpy.array([member.base_speed for member in members])
+        self.body_weight = numpy.array([member.body_weight for member in members])
+        self.food_need = numpy.array([member.food_need for member in members], dtype=float)
+
+        def per_party(values):
+            return numpy.tile(numpy.array(values, dtype=float), (n, 1))
+
+        self.health = per_party([member.health for member in members])
+        self.food = per_party([member.food for member in members])
+        self.water = per_party([member.water for member in members])
+        self.gear = per_party([member.gear for member in members])
+
+        self.severity = numpy.zeros((n, m, k))
+        self.afflicted = numpy.zeros((n, m, k), dtype=bool)
+        for j, member in enumerate(members):
+            for name, i in member.affliction_index.iteritems():
+                a = self.affliction_names.index(name)
+                self.severity[:, j, a] = member.severity[i]
+                self.afflicted[:, j, a] = True
+
+        # per-hour growth of hunger, thirst and fatigue, as in Member.update_weariness
+        self.weariness_rate = numpy.zeros(k)
+        self.weariness_rate[:3] = [HUNGER_RATE, THIRST_RATE, FATIGUE_RATE]
+
+        self.alive = self.health > 0
+
+
+    def update_condition(self, parties=None):
+        if parties is None:
+            parties = slice(None)
+
+        self.alive[parties] = self.health[parties] > 0
+        self.dead = ~self.alive.any(axis=1)
+        self.arrived = ~self.dead & (self.mile_marker >= self.destination)
+
+
+    def on_the_trail(self):
+        return ~(self.dead | self.arrived)
+
+
+    def number_alive(self):
+        return self.alive.sum(axis=1)
+
+
+    def day(self, party):
+        return self.calendar.day(self.clock[party])
+
+
+    def run(self):
+        while self.on_the_trail().any():
+            self.step()
+
+        causes = numpy.array(self.causes + [None], dtype=object)
+
+        return {'survivors': list(self.number_alive()),
+                'travel time': list(self.clock * 60.0 * 60.0),
+                'bear attacks': list(self.event_counter['bear attack']),
+                'events': self.event_counter,
+                'causes of death': causes[self.cause_of_death]}
+
+
+    def step(self):
+        """
+        Decide and act for every party still on the trail - one World.update each.
+        """
+        parties = numpy.nonzero(self.on_the_trail())[0]
+        decision = self.decision[self.mile_marker[parties] - self.trail.first_mile_marker]
+
+        if (decision == NO_ACTION).any():
+            raise ValueError('ERROR - No action has a defined utility, connot continue.')
+
+        choose = parties[decision == CHOOSE]
+        travel = parties[decision == TRAVEL]
+        ford = parties[decision == FORD]
+        if len(choose) > 0:
+            choose_travel = self.decide_greatest_need(choose)
+            travel = numpy.concatenate([travel, choose[choose_travel]])
+            ford = numpy.concatenate([ford, choose[~choose_travel]])
+
+        elapsed_time = numpy.zeros(self.parties)
+        if len(travel) > 0:
+            elapsed_time[travel] = self.travel(travel)
+        if len(ford) > 0:
+            elapsed_time[ford] = self.ford(ford)
+
+        self.clock[parties] += elapsed_time[parties]
+
+        self.update_condition()
+
+
+    def min_speed(self, parties):
+        # Member.weighted_speed of the slowest living member
+        pack_weight = self.food[parties] + self.water[parties] + self.gear[parties]
+        speed = 1.0 / (((3600 / self.base_speed) + (pack_weight / self.body_weight * 100 * 6)) / 3600.0)
+        speed[~self.alive[parties]] = numpy.inf
+        return speed.min(axis=1)
+
+
+    def travel(self, parties):
+        """
+        Party.travel for a group of parties. Returns the elapsed time in hours for each.
+        """
+        mile = self.mile_marker[parties] - self.trail.first_mile_marker
+
+        speed = PACE_MODIFIERS[self.pace] * self.surface_modifier[mile] * self.min_speed(parties)
+        assert (speed > 0).all(), 'speed must be positive'
+        travel_time = self.distance[mile] / speed
+
+        travel_delay = numpy.zeros(len(parties))
+        progress = numpy.ones(len(parties), dtype=bool)
+
+        for d in range(self.danger_probability.shape[1]):
+            hit = progress & (numpy.random.uniform(size=len(parties)) < self.danger_probability[mile, d])
+            if not hit.any():
+                continue
+
+            hit_parties = parties[hit]
+            victim = self.choose_living_member(hit_parties)
+            k, theta = self.danger_severity[mile[hit], d, 0], self.danger_severity[mile[hit], d, 1]
+            severity = numpy.floor(numpy.random.gamma(k, theta) + 0.5)
+            travel_delay[hit] = self.danger_delay[mile[hit], d]
+
+            affliction = self.danger_affliction[mile[hit], d]
+            is_affliction = affliction >= 0
+            if is_affliction.any():
+                # give it to the victim unless they already have it, and continue travel
+                p, v, a = hit_parties[is_affliction], victim[is_affliction], affliction[is_affliction]
+                new = ~self.afflicted[p, v, a]
+                self.severity[p[new], v[new], a[new]] = severity[is_affliction][new]
+                self.afflicted[p[new], v[new], a[new]] = True
+
+            # a one-time event hurts the victim and stops the party for this turn
+            event = ~is_affliction
+            p, v = hit_parties[event], victim[event]
+            self.health[p, v] -= severity[event]
+            self.alive[p, v] = self.health[p, v] > 0
+            killed = ~self.alive[p, v]
+            self.cause_of_death[p[killed], v[killed]] = self.danger_name[mile[hit][event][killed], d]
+
+            stopped = numpy.nonzero(hit)[0][event]
+            progress[stopped] = False
+            bears = self.danger_name[mile[stopped], d] == self.bear_attack
+            self.event_counter['bear attack'][parties[stopped[bears]]] += 1
+
+        self.mile_marker[parties[progress]] += 1
+
+        elapsed_time = travel_time + travel_delay
+        self.update_party(parties, elapsed_time)
+
+        return elapsed_time
+
+
+    def choose_living_member(self, parties):
+        # uniform choice among each party's living members
+        alive = self.alive[parties]
+        k = numpy.floor(numpy.random.uniform(size=len(parties)) * alive.sum(axis=1))
+        return (numpy.cumsum(alive, axis=1) > k[:, numpy.newaxis]).argmax(axis=1)
+
+
+    def update_party(self, parties, elapsed_time):
+        # Member.update_health then Member.update_weariness for the living members
+        alive = self.alive[parties]
+        t = elapsed_time[:, numpy.newaxis]
+
+        severity = self.severity[parties]
+        health = self.health[parties]
+        harm = severity * t[:, :, numpy.newaxis]
+        self.health[parties] = numpy.where(alive, health - harm.sum(axis=2), health)
+        self.severity[parties] = severity + (alive * t)[:, :, numpy.newaxis] * self.weariness_rate
+
+        # the affliction that took a member's health to zero is the cause of death
+        died = alive & (self.health[parties] <= 0)
+        if died.any():
+            p, v = numpy.nonzero(died)
+            fatal = (numpy.cumsum(harm[p, v], axis=1) >= health[p, v][:, numpy.newaxis]).argmax(axis=1)
+            self.cause_of_death[parties[p], v] = self.affliction_cause[fatal]
+
+        self.update_condition(parties)
+
+
+    def ford(self, parties):
+        """
+        Party.ford for a group of parties. Returns the elapsed time in hours for each.
+        """
+        failure_rate, food_loss_fraction = self.ford_rates(parties)
+
+        failure = numpy.random.uniform(size=len(parties)) < failure_rate
+        # wet food is all lost
+        lose_food = numpy.random.uniform(size=len(parties)) < food_loss_fraction
+
+        self.mile_marker[parties[~failure]] += 1
+        self.event_counter['failed to ford'][parties[failure]] += 1
+
+        lost = parties[lose_food]
+        self.food[lost] = numpy.where(self.alive[lost], 0.0, self.food[lost])
+
+        self.feed(parties)
+        self.update_condition(parties)
+
+        return numpy.ones(len(parties))
+
+
+    def ford_rates(self, parties):
+        failure_rate = numpy.empty(len(parties))
+        food_loss_fraction = numpy.empty(len(parties))
+        for i, party in enumerate(parties):
+            river = self.river(party)
+            day = self.day(party)
+            failure_rate[i] = river.ford_failure_rate(day)
+            food_loss_fraction[i] = river.ford_food_loss_fraction(day)
+
+        return failure_rate, food_loss_fraction
+
+
+    def river(self, party):
+        mile_marker = self.mile_marker[party]
+        river = self.rivers[mile_marker][party]
+        if river is None:
+            river = copy.copy(self.trail.path[mile_marker])
+            river.initialize_river_state(self.start_datetime.year)
+            self.rivers[mile_marker][party] = river
+
+        return river
+
+
+    def feed(self, parties):
+        # Party.feed - each living member in turn takes a ration out of the party's shared food
+        alive = self.alive[parties]
+        for j in range(len(self.food_need)):
+            total_food = (self.food[parties] * alive).sum(axis=1)
+            ration = numpy.where(alive[:, j], numpy.minimum(self.food_need[j], total_food), 0.0)
+
+            self.food[parties] -= round_robin_removal(self.food[parties], ration, alive)
+
+            severity = numpy.where(ration == 0, -10.0, numpy.where(ration < self.food_need[j], -5.0, 0.0))
+            self.severity[parties[alive[:, j]], j, 0] = severity[alive[:, j]]
+
+
+    def decide_greatest_need(self, parties):
+        """
+        Party.decide_greatest_need at stops where both travel and ford have a utility. Returns True where travel wins.
+        """
+        return self.utility_travel(parties) >= self.utility_ford(parties)
+
+
+    def utility_travel(self, parties):
+        a = 1.0/15.0
+        b = 3.1/2.0
+
+        mile = self.mile_marker[parties] - self.trail.first_mile_marker
+        season = numpy.array([SEASONS.index(self.calendar.season(self.clock[party])) for party in parties])
+        benefit = numpy.ceil(PACE_MODIFIERS[self.pace] * self.season_modifier[mile, season] * self.min_speed(parties))
+
+        cost = 1.0/(0.1 + self.remaining_food(parties, 0.0)) + 1.0/(0.1 + self.remaining_health(parties))
+        return a*benefit - b*cost
+
+
+    def utility_ford(self, parties):
+        a = 1.0
+        b = 3.1/2.0
+
+        failure_rate, food_loss_fraction = self.ford_rates(parties)
+        benefit = 1.0 * failure_rate
+
+        total_food = (self.food[parties] * self.alive[parties]).sum(axis=1)
+        cost = 1.0/(0.1 + self.remaining_food(parties, food_loss_fraction * total_food)) + \
+            1.0/(0.1 + self.remaining_health(parties))
+        return a*benefit - b*cost
+
+
+    def remaining_food(self, parties, lost_food):
+        # Party.remaining_food for one day, in days of food
+        alive = self.alive[parties]
+        total_need = (self.food_need * alive).sum(axis=1)
+        total_food = (self.food[parties] * alive).sum(axis=1)
+        return numpy.maximum((total_food - total_need - lost_food) / total_need, 0.0)
+
+
+    def remaining_health(self, parties):
+        # Party.remaining_health for one day, in days of health of the worst-off member
+        alive = self.alive[parties]
+        severity = self.severity[parties].sum(axis=2)
+        health = self.health[parties] + severity
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            remaining_days = numpy.where(severity == 0, 100.0, health / severity)
+        remaining_days[~alive] = numpy.inf
+        return numpy.maximum(remaining_days.min(axis=1), 0.0)
+
+
+
+def round_robin_removal(inventory, amount, eligible):
+    """
+    How much each member gives up when amount is taken from a party a pound at a time, round robin in member order,
+    never taking a member below zero (util.round_robin_take). Vectorized over parties: inventory and eligible are (N, M),
+    amount is (N,). A fractional last pound goes to the next member in turn.
+    """
+    inventory = numpy.where(eligible, inventory, 0.0)
+    amount = numpy.minimum(amount, inventory.sum(axis=1))
+
+    # r = number of whole rounds: the largest integer with sum(min(inventory, r)) <= amount
+    low = numpy.zeros(len(amount))
+    high = numpy.ceil(inventory.max(axis=1)) if inventory.size else low
+    while (high > low).any():
+        mid = numpy.ceil((low + high) / 2.0)
+        fits = numpy.minimum(inventory, mid[:, numpy.newaxis]).sum(axis=1) <= amount
+        low = numpy.where(fits, mid, low)
+        high = numpy.where(fits, high, mid - 1)
+
+    r = low[:, numpy.newaxis]
+    taken = numpy.minimum(inventory, r)
+
+    # the rest goes one pound (or what is left of one) per member, in order, in the next round
+    left = amount - taken.sum(axis=1)
+    next_round = numpy.minimum(inventory, r + 1) - taken
+    before = numpy.cumsum(next_round, axis=1) - next_round
+    taken += numpy.clip(left[:, numpy.newaxis] - before, 0.0, next_round)
+
+    return taken
@@ -1,11 +1,13 @@
-from stop import Stop
+from stop import Stop, shared_actions
+from terrain import TerrainSection, terrain_section
 
 class Camp(Stop):
     '''
     Camp is the standard stop on the trail when travelling between towns, forts, and rivers.
     A camp is the only type of stop where you can hunt, so hunting related items are contained in this class.
     '''
-    
+    __slots__ = ()
+
     def __init__(self, name='camp', mile_marker=None, add_actions=None, rem_actions=None, properties=None):
 
         Stop.__init__(self)
@@ -32,12 +34,16 @@ class Camp(Stop):
 
         self.actions.update(add_actions)
         self.actions.difference_update(rem_actions)
+        self.actions = shared_actions(self.actions)
 
-        self.properties.update(properties)
+        # a camp between the trail's stops refers to its terrain section, shared with the other camps on it
+        self.properties = terrain_section(properties)
 
 
     def set_terrain(self, terrain):
-        self.properties.update(terrain)
+        properties = dict(self.properties)
+        properties.update(terrain)
+        self.properties = TerrainSection(properties)
 
 
     """
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from util import date_to_season
+
+# day number (proleptic Gregorian ordinal, as from date.toordinal()) --> season, filled in a whole year at a time
+_seasons = dict()
+
+
+def season_of_day(day):
+    season = _seasons.get(day)
+    if season is None:
+        year = datetime.fromordinal(day).year
+        first = datetime(year, 1, 1).toordinal()
+        last = datetime(year, 12, 31).toordinal()
+        for d in range(first, last + 1):
+            _seasons[d] = date_to_season(datetime.fromordinal(d))
+        season = _seasons[day]
+
+    return season
+
+
+class Calendar():
+    """
+    The simulation keeps time as a plain number, hours since the start. A Calendar maps that number to the day (as a
+    day number, date.toordinal()) and season it falls in, and to a datetime for output.
+    """
+    def __init__(self, start_datetime):
+        self.start_datetime = start_datetime
+        self.start_day = start_datetime.toordinal()
+        # hours from midnight of the first day to the start
+        self.start_hour = (start_datetime - datetime.fromordinal(self.start_day)).total_seconds() / 3600.0
+
+
+    def day(self, hours):
+        return self.start_day + int((self.start_hour + hours) // 24.0)
+
+
+    def season(self, hours):
+        return season_of_day(self.day(hours))
+
+
+    def year(self, hours):
+        return datetime.fromordinal(self.day(hours)).year
+
+
+    def datetime(self, hours):
+        return self.start_datetime + timedelta(hours=hours)
@@ -0,0 +1,267 @@
+import json
+import os
+import os.path
+from datetime import datetime
+
+import numpy
+
+from lib.trail import Trail
+from lib.camp import Camp
+from lib.river import River
+from lib.town import Town
+from lib.terrain import TerrainSection
+
+FORMAT = 'tort trail'
+VERSION = 2
+
+# stop kind codes in the 'kind' array; 0 is a mile marker with no stop
+STOP_KINDS = [None, 'camp', 'town', 'river']
+STOP_KIND_CODES = {Camp: 1, Town: 2, River: 3}
+
+# kinds of Trail.stop_mile_markers, by stop kind code
+STOP_TABLE_KINDS = {'major': (2, 3), 'river': (3,), 'town': (2,)}
+
+# arrays are laid out one after another, each starting on a multiple of this many bytes
+ALIGNMENT = 8
+
+
+def compile_trail(trail_file_name, terrain_file_name, file_name):
+    """
+    Compile a trail and its terrain into a binary artifact: file_name holds the arrays, and file_name + '.json' a
+    header describing them, with the trail file's stops, which are few. The trail is built and checked once here, so
+    loading it (CompiledTrail) parses no per-mile or per-section data and computes no tables.
+
+    Per mile marker: the stop kind (see STOP_KINDS), its terrain section (-1 if none), and Trail's cost and leap tables.
+    Everything else about a mile is its section's. The sections are stored one after another as JSON, section i in the
+    bytes of 'terrain' from 'terrain offsets'[i] up to 'terrain offsets'[i + 1].
+    """
+    with open(trail_file_name, 'r') as trail_file:
+        trail_data = json.load(trail_file)
+    with open(terrain_file_name, 'r') as terrain_file:
+        terrain_data = json.load(terrain_file)
+    validate_trail_data(trail_data, terrain_data)
+
+    trail = Trail(datetime(2000, 1, 1), trail_file_name, terrain_file_name)
+    miles = trail.last_mile_marker + 1
+    sections = trail.terrain_index.sections
+    section_index = dict([(id(section), i) for i, section in enumerate(sections)])
+
+    kind = numpy.zeros(miles, dtype=numpy.uint8)
+    # camps between the trail's stops are described, not built (trail.LazyPath)
+    for start, end, stop, properties, actions in trail.path.segments():
+        kind[start:end] = STOP_KIND_CODES[Camp if stop is None else stop.__class__]
+
+    section = numpy.empty(miles, dtype=numpy.int32)
+    for mm in range(miles):
+        try:
+            section[mm] = section_index[id(trail.get_terrain(mm))]
+        except ValueError:
+            section[mm] = -1
+
+    terrain = [json.dumps(dict(s)) for s in sections]
+    terrain_offsets = numpy.cumsum([0] + [len(s) for s in terrain])
+
+    arrays = [('kind', kind),
+              ('section', section),
+              ('terrain offsets', terrain_offsets),
+              ('terrain', numpy.frombuffer(''.join(terrain), dtype=numpy.uint8)),
+              ('mile cost', numpy.array(trail.mile_cost)),
+              ('quiet until', numpy.array(trail.quiet_until, dtype=numpy.int32)),
+              ('cost sum', numpy.array(trail.cost_sum)),
+              ('cost square sum', numpy.array(trail.cost_square_sum)),
+              ('hazard sum', numpy.array(trail.hazard_sum))]
+
+    specs = list()
+    offset = 0
+    with open(file_name, 'wb') as compiled_file:
+        for name, array in arrays:
+            padding = -offset % ALIGNMENT
+            compiled_file.write('\0' * padding)
+            offset += padding
+            numpy.ascontiguousarray(array).tofile(compiled_file)
+            specs.append([name, array.dtype.str, list(array.shape), offset])
+            offset += array.nbytes
+
+    header = {'format': FORMAT,
+              'version': VERSION,
+              'size': offset,
+              'arrays': specs,
+              'first mile marker': trail.first_mile_marker,
+              'last mile marker': trail.last_mile_marker,
+              'river mile markers': trail.river_mile_markers,
+              'trail': trail_data,
+              'sources': [source_stamp(trail_file_name), source_stamp(terrain_file_name)]}
+
+    # write then rename, so a crash never leaves a half-written header
+    with open(file_name + '.json.tmp', 'w') as header_file:
+        json.dump(header, header_file)
+    os.rename(file_name + '.json.tmp', file_name + '.json')
+
+
+def source_stamp(file_name):
+    status = os.stat(file_name)
+    return [os.path.abspath(file_name), status.st_size, status.st_mtime]
+
+
+def validate_trail_data(trail_data, terrain_data):
+    """
+    Check what Trail would only stumble over while simulating, or not notice at all. Raises ValueError.
+    """
+    for trail_stop in trail_data:
+        if trail_stop.get('kind') not in STOP_KINDS[1:]:
+            raise ValueError('ERROR - Trail stop kind ' + str(trail_stop.get('kind')) + ' not implemented.')
+
+    for section in terrain_data:
+        if section.get('surface speed modifier', 1.0) <= 0:
+            raise ValueError('ERROR - surface speed modifier must be positive: ' + str(section['trail section']))
+
+        for danger in section.get('dangers', list()):
+            if not 0.0 <= danger['probability'] <= 1.0:
+                raise ValueError('ERROR - danger probability must be between 0 and 1: ' + str(danger))
+            mean, std = danger['severity']
+            if mean <= 0 or std <= 0:
+                raise ValueError('ERROR - danger severity mean and std must be positive: ' + str(danger))
+            if danger['travel delay'] < 0:
+                raise ValueError('ERROR - danger travel delay must not be negative: ' + str(danger))
+
+
+def read_compiled_trail(file_name):
+    """
+    Map a compiled trail's arrays into memory, read-only, so that every process using it shares one copy through the
+    OS page cache.
+
+    Returns: (header, dict of array name --> array)
+    -------
+    """
+    with open(file_name + '.json', 'r') as header_file:
+        header = json.load(header_file)
+
+    if header.get('format') != FORMAT or header.get('version') != VERSION:
+        raise ValueError('ERROR - not a compiled trail of version ' + str(VERSION) + ': ' + str(file_name))
+    if os.path.getsize(file_name) != header['size']:
+        raise ValueError('ERROR - compiled trail does not match its header, recompile it: ' + str(file_name))
+
+    for source, size, mtime in header['sources']:
+        if os.path.exists(source):
+            status = os.stat(source)
+            if (status.st_size, status.st_mtime) != (size, mtime):
+                print 'WARNING - ' + source + ' has changed since ' + file_name + ' was compiled from it'
+
+    data = numpy.memmap(file_name, dtype=numpy.uint8, mode='r')
+    arrays = dict()
+    for name, dtype, shape, offset in header['arrays']:
+        dtype = numpy.dtype(str(dtype))
+        size = dtype.itemsize * int(numpy.prod(shape))
+        arrays[name] = data[offset:offset + size].view(dtype).reshape(shape)
+
+    return header, arrays
+
+
+
+class CompiledTrail(Trail):
+    """
+    A Trail loaded from a compiled artifact (compile_trail). The arrays stay memory-mapped and are read in place, so
+    every process using the trail shares one copy: Trail's cost and leap tables (MappedColumn), and each mile's terrain
+    section, which is parsed the first time a mile on it is looked up (TerrainIndexFromArrays). Only the trail file's
+    stops are built from the header.
+    """
+    def __init__(self, date_and_time, file_name):
+        self.header, self.arrays = read_compiled_trail(file_name)
+
+        self.trail_data = self.header['trail']
+        # the terrain is read from the artifact a section at a time
+        self.terrain_data = None
+        self.terrain_index = TerrainIndexFromArrays(self.arrays['section'], self.arrays['terrain offsets'],
+                                                    self.arrays['terrain'])
+
+        self.initialize_path()
+        self.initialize_cost_table()
+        self.initialize_leap_tables()
+
+        self.river_mile_markers = self.header['river mile markers']
+        for mile_marker in self.river_mile_markers:
+            self.path[mile_marker].initialize_river_state(date_and_time.year)
+
+
+    def initialize_stop_tables(self):
+        self.first_mile_marker = self.header['first mile marker']
+        self.last_mile_marker = self.header['last mile marker']
+
+        self.stop_mile_markers = dict()
+        for kind, codes in STOP_TABLE_KINDS.iteritems():
+            self.stop_mile_markers[kind] = numpy.flatnonzero(numpy.in1d(self.arrays['kind'], codes)).tolist()
+
+
+    def initialize_cost_table(self):
+        self.mile_cost = MappedColumn(self.arrays['mile cost'])
+
+
+    def initialize_leap_tables(self):
+        self.quiet_until = MappedColumn(self.arrays['quiet until'])
+        self.cost_sum = MappedColumn(self.arrays['cost sum'])
+        self.cost_square_sum = MappedColumn(self.arrays['cost square sum'])
+        self.hazard_sum = MappedColumn(self.arrays['hazard sum'])
+
+
+
+class MappedColumn(object):
+    """
+    A per-mile array of a compiled trail, read in place. Its items come out as plain Python numbers, as they do from
+    Trail's array.array tables, so arithmetic on them is the same for either kind of trail.
+    """
+    __slots__ = ('column',)
+
+    def __init__(self, column):
+        self.column = column
+
+
+    def __getitem__(self, i):
+        return self.column.item(i)
+
+
+    def __len__(self):
+        return len(self.column)
+
+
+
+class TerrainIndexFromArrays():
+    """
+    A stand-in for terrain.TerrainIndex over a compiled trail, where each mile marker's section is already known.
+    """
+    def __init__(self, section, terrain_offsets, terrain):
+        # mile marker --> section number, -1 if none
+        self.section = section
+        self.terrain_offsets = terrain_offsets
+        self.terrain = terrain
+        # section number --> TerrainSection, for the sections looked up so far
+        self.sections = dict()
+
+
+    def lookup(self, mile_marker):
+        i = self.section.item(mile_marker) if 0 <= mile_marker < len(self.section) else -1
+        if i < 0:
+            raise ValueError('ERROR - no trail section found at mile marker ' + str(mile_marker))
+        return self.terrain_section(i)
+
+
+    def terrain_section(self, i):
+        section = self.sections.get(i)
+        if section is None:
+            start, end = self.terrain_offsets.item(i), self.terrain_offsets.item(i + 1)
+            section = TerrainSection(json.loads(self.terrain[start:end].tostring()))
+            self.sections[i] = section
+        return section
+
+
+    def runs(self, start, end):
+        # as terrain.TerrainIndex.runs
+        if start < 0 or end > len(self.section):
+            raise ValueError('ERROR - no trail section found at mile marker ' + str(start if start < 0 else end - 1))
+        section = self.section[start:end]
+        missing = numpy.flatnonzero(section < 0)
+        if len(missing):
+            raise ValueError('ERROR - no trail section found at mile marker ' + str(start + missing[0]))
+
+        bounds = [0] + (numpy.flatnonzero(numpy.diff(section)) + 1).tolist() + [len(section)]
+        for first, after in zip(bounds[:-1], bounds[1:]):
+            yield start + first, start + after, self.terrain_section(section.item(first))
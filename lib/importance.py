@@ -0,0 +1,47 @@
+import math
+
+from util import gamma_parameters
+
+
+class DangerTilt():
+    """
+    Importance sampling of the dangers on the trail. Dangers strike danger_factor times as often as the terrain says (up
+    to max_probability a roll), and their severities are drawn from a gamma distribution of the same shape with its
+    scale, and so its mean, multiplied by severity_factor. Rare disasters then turn up in far fewer trials.
+
+    Each trial carries a likelihood ratio weight, the product over its draws of the chance of the draw under the terrain's
+    own distribution over its chance under the tilted one. Weighted means (stats.WeightedStatistics) are unbiased
+    estimates of the untilted means. The weight is kept as a log, since it is a product over every roll of the trip.
+    """
+    def __init__(self, danger_factor=1.0, severity_factor=1.0, max_probability=0.5):
+        if danger_factor <= 0 or severity_factor <= 0:
+            raise ValueError('ERROR - tilt factors must be positive: ' + str((danger_factor, severity_factor)))
+        if not 0.0 < max_probability < 1.0:
+            raise ValueError('ERROR - tilted probabilities must be capped between 0 and 1: ' + str(max_probability))
+
+        self.danger_factor = danger_factor
+        self.severity_factor = severity_factor
+        self.max_probability = max_probability
+
+
+    def probability(self, probability):
+        # never tilt a danger below its own probability, only cap how far up it goes
+        return max(probability, min(probability * self.danger_factor, self.max_probability))
+
+
+    def roll_log_ratio(self, probability, tilted_probability, strikes):
+        if strikes:
+            return math.log(probability / tilted_probability)
+        return math.log((1.0 - probability) / (1.0 - tilted_probability))
+
+
+    def severity(self, mean, std, stream):
+        """
+        Returns: (severity drawn from the tilted gamma distribution, log likelihood ratio of the draw)
+        -------
+        """
+        k, theta = gamma_parameters(mean, std)
+        s = self.severity_factor
+        x = stream.gamma(k, theta * s)
+
+        return x, k * math.log(s) - x / theta + x / (theta * s)
@@ -1,10 +1,26 @@
-from afflictions import Affliction
+from afflictions import Affliction, HUNGER, THIRST, FATIGUE, BASE_AFFLICTIONS
 from numpy import tanh
 
-class Member():
+# hourly growth of hunger, thirst and fatigue severity: a = 200 / (lifetime * 24) ^ 2
+HUNGER_RATE = 0.007
+THIRST_RATE = 0.039
+FATIGUE_RATE = 0.039
+WEARINESS_RATE = HUNGER_RATE + THIRST_RATE + FATIGUE_RATE
+
+
+class Member(object):
     """
     Defines a member of the travelling party.
+
+    Inventory items are plain attributes (food, water, gear) and affliction severities live in a list with a fixed
+    position for each affliction, given by affliction_index. Hunger, thirst and fatigue are always at HUNGER, THIRST and
+    FATIGUE. Severities change only through the methods here (set_severity, add_affliction, update_weariness), which
+    keep their running sum, severity_total, up to date.
     """
+    __slots__ = ('name', 'health', 'food_need', 'water_need', 'base_speed', 'body_weight',
+                 'food', 'water', 'gear', 'severity', 'severity_total', 'affliction_index',
+                 'cause_of_death')
+
     def __init__(self, member_def=None):
         assert member_def is not None, 'ERROR - you need to provide a member definition dictionary.'
 
@@ -14,27 +30,55 @@ class Member():
             self.food_need = member_def['needs']['food']
             self.water_need = member_def['needs']['water']
             self.base_speed = float(member_def['abilities']['speed'])
-            self.inventory = member_def['inventory']
+            self.food = member_def['inventory'].get('food', 0)
+            self.water = member_def['inventory'].get('water', 0)
+            self.gear = member_def['inventory'].get('gear', 0)
             self.body_weight = float(member_def['condition']['weight'])
         except:
             print 'There was an error reading the member definition dictionary:'
             print member_def
             raise
 
-        hunger = Affliction({'name': 'hunger', 'severity': 0})
-        thirst = Affliction({'name': 'thirst', 'severity': 0})
-        fatigue = Affliction({'name': 'fatigue', 'severity': 0})
+        self.cause_of_death = None
 
-        self.afflictions = dict([(a.name, a) for a in [hunger, thirst, fatigue]])
+        self.severity = [0, 0, 0]
+        self.severity_total = 0
+        self.affliction_index = dict([(name, i) for i, name in enumerate(BASE_AFFLICTIONS)])
 
         for affliction_def in member_def.get('afflictions', list()):
             a = Affliction(affliction_def)
-            self.afflictions[a.name] = a
+            if a.name in self.affliction_index:
+                self.set_severity(self.affliction_index[a.name], a.severity)
+            else:
+                self.add_affliction(a.name, a.severity)
 
     def print_status(self):
         print 'Health:', self.health
-        print '(Hunger, Thirst, Fatigue):', [self.afflictions[a].severity for a in ['hunger', 'thirst', 'fatigue']]
-        print '(Food, Water, Weight):', [self.inventory.get('food'), self.inventory.get('water'), self.pack_weight()]
+        print '(Hunger, Thirst, Fatigue):', self.severity[:3]
+        print '(Food, Water, Weight):', [self.food, self.water, self.pack_weight()]
+
+
+    def has_affliction(self, name):
+        return name in self.affliction_index
+
+
+    def add_affliction(self, name, severity):
+        self.affliction_index[name] = len(self.severity)
+        self.severity.append(severity)
+        self.severity_total += severity
+
+
+    def set_severity(self, i, severity):
+        self.severity_total += severity - self.severity[i]
+        self.severity[i] = severity
+
+
+    def affliction_severity(self, name):
+        return self.severity[self.affliction_index[name]]
+
+
+    def total_severity(self):
+        return self.severity_total
 
 
     def update_health(self, elapsed_time, danger=None, danger_severity=None):
@@ -43,17 +87,27 @@ class Member():
             self.health -= danger_severity
             if self.health <= 0:
                 #print self.name + ' has died of ' + danger
-                self.food_need = None
-                self.water_need = None
+                self.die(danger)
 
         # an affliction is a long-term condition that causes harm
-        for affliction in self.afflictions.values():
+        for i, severity in enumerate(self.severity):
             if self.health > 0:
-                self.health -= affliction.severity * elapsed_time
+                self.health -= severity * elapsed_time
                 if self.health <= 0:
-                    #print self.name + ' has died of ' + affliction.name
-                    self.food_need = None
-                    self.water_need = None
+                    #print self.name + ' has died of ' + self.affliction_name(i)
+                    self.die(self.affliction_name(i))
+
+
+    def die(self, cause):
+        self.food_need = None
+        self.water_need = None
+        self.cause_of_death = cause
+
+
+    def affliction_name(self, i):
+        for name, j in self.affliction_index.iteritems():
+            if i == j:
+                return name
 
     # as time passes, you become hungrier, thirstier, and more tiered
     # when you eat, drink, or rest you reduce these
@@ -61,19 +115,25 @@ class Member():
     def update_hunger(self, elapsed_time):
         # a = 200 / (lifetime * 24) ^ 2
         # lifetime = 7 --> a = 0.007
-        self.afflictions['hunger'].severity += 0.007 * elapsed_time
+        growth = HUNGER_RATE * elapsed_time
+        self.severity[HUNGER] += growth
+        self.severity_total += growth
 
 
     def update_thirst(self, elapsed_time):
         # a = 200 / (lifetime * 24) ^ 2
         # lifetime = 3 --> a = 0.039
-        self.afflictions['thirst'].severity += 0.039 * elapsed_time
+        growth = THIRST_RATE * elapsed_time
+        self.severity[THIRST] += growth
+        self.severity_total += growth
 
 
     def update_fatigue(self, elapsed_time):
         # a = 200 / (lifetime * 24) ^ 2
         # lifetime = 3 --> a = 0.039
-        self.afflictions['fatigue'].severity += 0.039 * elapsed_time
+        growth = FATIGUE_RATE * elapsed_time
+        self.severity[FATIGUE] += growth
+        self.severity_total += growth
 
 
     def update_weariness(self, elapsed_time):
@@ -82,12 +142,23 @@ class Member():
         self.update_fatigue(elapsed_time)
 
 
-    def pack_weight(self):
-        pack_weight = 0
-        for item in ['food', 'water', 'gear']:
-            pack_weight += self.inventory.get(item)
+    def health_after(self, hours, square_hours):
+        """
+        Health after a run of steps that take hours in all, where the squares of the step lengths add up to square_hours.
+        Each step drains severity * step and then grows weariness linearly, so the drain adds up in closed form:
+        sum(step_i * (severity + WEARINESS_RATE * time before step_i)).
+        """
+        return self.health - self.total_severity() * hours - WEARINESS_RATE * (hours * hours - square_hours) / 2.0
+
+
+    def advance(self, hours, square_hours):
+        # update_health and update_weariness over a run of steps at once - the caller makes sure nobody dies on the way
+        self.health = self.health_after(hours, square_hours)
+        self.update_weariness(hours)
 
-        return float(pack_weight)
+
+    def pack_weight(self):
+        return float(self.food + self.water + self.gear)
 
 
     def weight_speed_modifier(self):
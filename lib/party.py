@@ -1,28 +1,33 @@
 import json
+import math
+from bisect import bisect_right
 from util import *
-from datetime import datetime, timedelta
 
 from member import Member
 from stop import Stop
 from camp import Camp
 from river import River
 from town import Town
-from afflictions import Affliction
+from afflictions import HUNGER
 
-from numpy import ceil, sign
-from numpy.random import uniform, normal, randint, choice
+from numpy import ceil
+from rng import streams
+from clock import Calendar
+from strategies import get_strategy
 
 
 class Party():
     """
     Defines the trail and simulates a party travelling it.
     """
-    def __init__(self, date_and_time, party_file_name=None, trail=None):
+    def __init__(self, date_and_time, party_file_name=None, trail=None, tilt=None):
         if party_file_name is not None:
             with open(party_file_name, 'r') as party_file:
                 party_data = json.load(party_file)
 
             self.start_datetime = date_and_time
+            # the party's time is hours since the start, see clock.Calendar
+            self.calendar = Calendar(date_and_time)
 
         else:
             raise ValueError('ERROR - party config file required to initialize party.')
@@ -41,25 +46,59 @@ class Party():
 
         self.pace = 'normal'
 
+        # travel_speed() cache, cleared whenever the inventory or the roster changes
+        self.speed = None
+        self.speed_pace = None
+        self.hours_per_mile = None
+
         self.living_members = dict()
         for id, member_def in enumerate(party_data['members']):
             self.living_members[id] = Member(member_def)
 
         self.dead_members = dict()
 
+        # running totals over the living members, see update_totals
+        self.update_totals()
+
         self.update_condition()
 
         self.action = None
+        self.strategy_name = None
+        self.strategy = None
+
+        # random streams for this trial, drawn from in blocks. Each kind of draw has its own stream, so that the nth
+        # danger roll, victim or severity is the same number in every variant of a scenario run on the same seed, even
+        # when the variants' events differ (runner.run_paired_trials)
+        self.dangers = streams.stream('dangers')
+        self.victims = streams.stream('victims')
+        self.severities = streams.stream('severities')
+        self.crossings = streams.stream('crossings')
+
+        # drawn by leap(): the mile of leapable terrain (Trail.hazard_sum) on which the next danger strikes, the leapable
+        # miles before it being quiet; kept until the party travels that mile, however many leaps and steps it takes
+        self.danger_mile = None
+
+        # importance sampling (importance.DangerTilt), and the log likelihood ratio weight of the draws so far
+        self.tilt = tilt
+        self.log_weight = 0.0
 
 
     def update_condition(self):
         # move members from living to dead
+        roster_changed = False
         living_member_ids = self.living_members.keys()
         for id in living_member_ids:
             member = self.living_members[id]
             if member.health <= 0:
+                if member.cause_of_death is None:
+                    member.cause_of_death = 'unknown'
                 self.dead_members[id] = member
                 del self.living_members[id]
+                self.speed = None
+                roster_changed = True
+
+        if roster_changed:
+            self.update_totals()
 
         if self.number_alive() == 0:
             self.condition = 'dead'
@@ -70,9 +109,11 @@ class Party():
             self.condition = 'on the trail'
 
 
-    def decide(self, strategy, date_and_time):
+    def decide(self, strategy, trail, hours):
         """
-        Make decisions according to the current strategy. Update the party according to the outcome of the decisions.
+        Make decisions according to the current strategy: the name of one in strategies.STRATEGIES, or a
+        strategies.Strategy, which may look ahead along the trail. Update the party according to the outcome of the
+        decisions.
 
         Returns: action to take (travel (pace), cross river (method), trade (to buy, to sell), hunt, rest (length),
         repair, replace)
@@ -80,62 +121,36 @@ class Party():
 
         """
 
-        try:
-            strategies = {'greatest need': self.decide_greatest_need}
-        except KeyError:
-            raise ValueError('ERROR - requested strategy is not implemented: ' + str(strategy))
-
-        return strategies[strategy](date_and_time)
+        # strategies are looked up once, not on every decision
+        if strategy != self.strategy_name:
+            self.strategy = get_strategy(strategy) if isinstance(strategy, basestring) else strategy
+            self.strategy_name = strategy
 
+        return self.strategy.decide(self, trail, hours)
 
-    def decide_greatest_need(self, date_and_time):
-        available_actions = self.current_stop.actions
 
-        # party needs are a balance between continue and survive
-        # party high level needs are: continue and recover/resupply
-        # continue actions: travel/ferry/ford/caulk
-        # recover actions: rest/eat/drink/repair/trade/shop/hunt
+    def decide_greatest_need(self, trail, hours):
+        return self.decide('greatest need', trail, hours)
 
-        max_action, max_utility = None, None
-        for action in available_actions:
-            if action == 'travel':
-                utility = self.utility_travel(date_and_time)
-            elif action == 'ford':
-                utility = self.utility_ford(date_and_time)
-            elif action == 'caulk':
-                utility = self.utility_caulk(date_and_time)
-            else:
-                # we haven't implemented this yet
-                utility = None
-
-            if utility is not None:
-                if max_utility is None:
-                    max_action, max_utility = action, utility
-                elif utility > max_utility:
-                    max_action, max_utility = action, utility
-
-        if max_action is None:
-            raise ValueError('ERROR - No action has a defined utility, connot continue.')
-
-        return max_action
 
-
-    def utility_travel(self, date_and_time):
+    def utility_travel(self, hours, health_days=None):
         # conversion factors
         # the benefit of travelling 15 miles in a day is equal to the cost of having 3 days left of both food and health
         a = 1.0/15.0
         b = 3.1/2.0
 
         # nominal distance traveled in one day
-        benefit = self.party_speed(date_and_time)
+        benefit = self.party_speed(hours)
         # cost terms are both in number of days of remaining, so no need for yet another conversion factor
         # cost is geometric sum because 0 is very bad and large values are good
         parameters = {'days': 1}
-        cost = 1.0/float(0.1 + self.remaining_food(action='travel', parameters=parameters)) + 1.0/float(0.1 + self.remaining_health(action='travel', parameters=parameters))
+        if health_days is None:
+            health_days = self.remaining_health(action='travel', parameters=parameters)
+        cost = 1.0/float(0.1 + self.remaining_food(action='travel', parameters=parameters)) + 1.0/float(0.1 + health_days)
         return a*benefit - b*cost
 
 
-    def utility_ford(self, date_and_time):
+    def utility_ford(self, hours, health_days=None):
         # conversion factors
         # the benefit of crossing the river in a day is equal to the cost of having 3 days left of both food and health
         a = 1.0
@@ -144,12 +159,14 @@ class Party():
         # fording a river runs the risk of a) failure - being forced to go back or b) loss of provisions
 
         # expected distance traveled in one day
-        benefit = 1.0 * self.current_stop.ford_failure_rate(date_and_time)
+        benefit = 1.0 * self.current_stop.ford_failure_rate(self.calendar.day(hours))
         # cost terms are both in number of days of remaining, so no need for yet another conversion factor
         # cost is geometric sum because 0 is very bad and large values are good
-        expected_food_loss = self.current_stop.ford_food_loss_fraction(date_and_time) * self.total_inventory('food')
+        expected_food_loss = self.current_stop.ford_food_loss_fraction(self.calendar.day(hours)) * self.total_inventory('food')
         parameters = {'lost food': expected_food_loss}
-        cost = 1.0/float(0.1 + self.remaining_food(action='ford', parameters=parameters)) + 1.0/float(0.1 + self.remaining_health(action='ford', parameters=parameters))
+        if health_days is None:
+            health_days = self.remaining_health(action='ford', parameters=parameters)
+        cost = 1.0/float(0.1 + self.remaining_food(action='ford', parameters=parameters)) + 1.0/float(0.1 + health_days)
         return a*benefit - b*cost
 
 
@@ -171,24 +188,39 @@ class Party():
         return a*benefit - b*cost
 
 
+    def update_totals(self):
+        """
+        Work out from scratch the totals decisions need, which are then kept up to date as they change: food and water
+        carried (update_food) and food needed each day (when the roster changes, update_condition).
+        """
+        members = self.living_members.values()
+        self.food_total = sum([member.food for member in members])
+        self.water_total = sum([member.water for member in members])
+        self.food_need_total = sum([member.food_need for member in members])
+
+
     def total_inventory(self, item):
+        if item == 'food':
+            return self.food_total
+        elif item == 'water':
+            return self.water_total
+
         amount = 0
         for member in self.living_members.values():
-            amount += member.inventory.get(item, 0)
+            amount += getattr(member, item, 0)
 
         return amount
 
 
     def remaining_food(self, action, parameters):
         # the estiamted amount of food remaining in terms of days remaining after the given action is carried out
+        total_need = self.food_need_total
         if action == 'travel':
-            total_need = sum([member.food_need for member in self.living_members.values()])
-            remaining_food = self.total_inventory('food') - parameters['days'] * total_need
+            remaining_food = self.food_total - parameters['days'] * total_need
             remaining_days = remaining_food / float(total_need)
         elif action == 'ford':
             days = 1
-            total_need = sum([member.food_need for member in self.living_members.values()])
-            remaining_food = self.total_inventory('food') - days * total_need - parameters.get('lost food', 0)
+            remaining_food = self.food_total - days * total_need - parameters.get('lost food', 0)
             remaining_days = remaining_food / float(total_need)
         else:
             raise ValueError('ERROR - action not implemented: ' + str(action))
@@ -197,8 +229,9 @@ class Party():
 
 
     def feed(self):
+        # each living member in turn takes a ration out of the party's shared food
         for member in self.living_members.values():
-            ration = min(member.food_need, self.total_inventory('food'))
+            ration = min(member.food_need, self.food_total)
             self.update_food(-ration)
 
             if 0 < ration < member.food_need:
@@ -208,45 +241,37 @@ class Party():
             else:
                 severity = 0
 
-            member.afflictions['hunger'].severity = severity
+            member.set_severity(HUNGER, severity)
 
 
     def remaining_health(self, action, parameters):
         # todo: update this to hourly form daily
-        member_health = []
-        total_severity = []
+        if action == 'travel':
+            days = parameters['days']
+        elif action == 'ford':
+            days = 1
+        else:
+            raise ValueError('ERROR - action not implemented: ' + str(action))
 
+        # one pass over the living, with each member's severity sum kept up to date by Member
+        remaining_days = list()
         for member in self.living_members.values():
-            # only count values for living members
             if member.health > 0:
-                sev = 0
-                for name, affliction in member.afflictions.iteritems():
-                    sev += affliction.severity
-    
-                total_severity.append(sev)
-    
-                if action == 'travel':
-                    member_health.append(member.health + (parameters['days'] * sev))
-                elif action == 'ford':
-                    days = 1
-                    member_health.append(member.health + (days * sev))
-                else:
-                    raise ValueError('ERROR - action not implemented: ' + str(action))
-            
-        remaining_days = [(100 if s == 0 else h/float(s)) for h, s in zip(member_health, total_severity)]
+                sev = member.severity_total
+                remaining_days.append(100 if sev == 0 else (member.health + days * sev) / float(sev))
 
         return max(min(remaining_days), 0.0)
 
 
-    def update(self, trail, date_and_time):
+    def update(self, trail, hours):
         events = dict()
 
         if self.action == 'travel':
-            action_time, events = self.travel(trail, date_and_time)
+            action_time, events = self.travel(trail, hours)
         elif self.action == 'ford':
-            action_time, events = self.ford(trail, date_and_time)
+            action_time, events = self.ford(trail, hours)
         elif self.action == 'caulk':
-            action_time, events = self.caulk(trail, date_and_time)
+            action_time, events = self.caulk(trail, hours)
         else:
             raise ValueError('ERROR - Action not recognized: ' + str(self.action))
 
@@ -263,57 +288,57 @@ class Party():
         return len(self.living_members)
 
 
-    def party_speed(self, date_and_time):
-        # the party can only travel as fast as its slowest member
+    def causes_of_death(self):
+        # one entry per member, in the order of the party file - None for the living
+        causes = list()
+        for id in range(len(self.living_members) + len(self.dead_members)):
+            member = self.dead_members.get(id)
+            causes.append(None if member is None else member.cause_of_death)
+
+        return causes
 
-        min_speed = min([member.weighted_speed() for member in self.living_members.values()])
 
+    def pace_modifier(self):
         if self.pace == 'normal':
-            pace_modifier = 1.0
+            return 1.0
         elif self.pace == 'easy':
-            pace_modifier = 0.75
+            return 0.75
         elif self.pace == 'hard':
-            pace_modifier = 1.25
+            return 1.25
         else:
             raise ValueError('ERROR - Unknown pace: ' + str(self.pace))
 
-        travel_speeds = self.current_stop.properties.get('travel speed modifier')
-        if travel_speeds is not None:
-            terrain_modifier = travel_speeds[date_to_season(date_and_time)]
-        else:
-            terrain_modifier = 1.0
-
-        return int(ceil(pace_modifier * terrain_modifier * min_speed))
 
+    def travel_speed(self):
+        """
+        Miles per hour on flat, even ground: the pace times the speed of the slowest member, which depends on pack
+        weight. Cached, along with its inverse hours_per_mile, until the inventory, the roster or the pace changes.
+        """
+        if self.speed is None or self.speed_pace != self.pace:
+            # the party can only travel as fast as its slowest member
+            min_speed = min([member.weighted_speed() for member in self.living_members.values()])
+            self.speed = self.pace_modifier() * min_speed
+            assert self.speed > 0, 'speed must be positive'
+            self.speed_pace = self.pace
+            self.hours_per_mile = 1.0 / self.speed
 
-    def party_travel_time(self):
-        # travel_time is the time needed to cover the next mile of terrain
-        # the party can only travel as fast as its slowest member
+        return self.speed
 
-        min_speed = min([member.weighted_speed() for member in self.living_members.values()])
 
-        if self.pace == 'normal':
-            pace_modifier = 1.0
-        elif self.pace == 'easy':
-            pace_modifier = 0.75
-        elif self.pace == 'hard':
-            pace_modifier = 1.25
+    def party_speed(self, hours):
+        travel_speeds = self.current_stop.properties.travel_speed_modifier
+        if travel_speeds is not None:
+            terrain_modifier = travel_speeds[self.calendar.season(hours)]
         else:
-            raise ValueError('ERROR - Unknown pace: ' + str(self.pace))
-
-        # rule of thumb: add a mile for every 1000 feet elevation gain per mile
-        elevation_gain = self.current_stop.properties.get('elevation gain per mile')
-        added_distance = -0.2 if elevation_gain < -100 else (elevation_gain / 1000.0)
-
-        terrain_modifier = self.current_stop.properties.get('surface speed modifier', 1.0)
+            terrain_modifier = 1.0
 
-        speed = pace_modifier * terrain_modifier * min_speed
-        assert speed > 0, 'speed must be positive'
-        travel_time = (1.0 + added_distance)/speed
+        return int(ceil(terrain_modifier * self.travel_speed()))
 
-        # print 'Walking speed:', 1.0/travel_time
 
-        return travel_time
+    def party_travel_time(self, trail):
+        # travel_time is the time needed to cover the next mile of terrain: its cost (Trail.mile_cost) at the party's speed
+        self.travel_speed()
+        return trail.mile_cost[self.current_stop.mile_marker] * self.hours_per_mile
 
 
     def arrived(self):
@@ -322,7 +347,7 @@ class Party():
 
 
 
-    def travel(self, trail, date_and_time):
+    def travel(self, trail, hours):
         """
         Simulate one mile's travel along the trail. Update the condition of the party.
 
@@ -333,25 +358,71 @@ class Party():
         events = {'bear attack': False}
 
         # simulate each mile of travel until we either hit a major stop or encounter a calamity
-        travel_time = self.party_travel_time()
+        travel_time = self.party_travel_time(trail)
+
+        progress, travel_delay = self.encounter_dangers(trail, events)
+
+        if progress:
+            mile_marker = self.current_stop.mile_marker
+            self.current_stop = trail.path[mile_marker + 1]
+
+            if isinstance(self.current_stop, (River, Town)):
+                # arrived at next major stop
+                # print 'Arrived at ' + self.current_stop.name
+                1
+                if isinstance(self.current_stop, River):
+                    # print 'River conditions (width, depth) = ' + str(self.current_stop.river_state(self.calendar.day(hours)))
+                    1
+                self.last_major_stop = self.current_stop
+                self.next_major_stop = trail.next_major_stop(self.current_stop.mile_marker)
 
+        elapsed_time = travel_time + travel_delay
+
+        self.update_party(elapsed_time)
+
+        return elapsed_time, events
+
+
+    def encounter_dangers(self, trail, events):
+        """
+        Roll for each danger of the current stop. An affliction is given to its victim and travel continues; a one-time
+        event hurts its victim and stops the party for this mile. Events that happened are flagged in events.
+
+        On leapable terrain, a danger_mile drawn by leap() stands in for the rolls: the miles before it are quiet, and
+        on it the first danger to strike is drawn given that one does.
+
+        Returns: (whether the party makes progress, travel delay in hours)
+        -------
+        """
         progress = True
         travel_delay = 0
 
-        for danger in self.current_stop.properties.get('dangers', list()):
-            if uniform() < danger['probability']:
+        dangers = self.current_stop.properties.dangers
+
+        forced = None
+        mile_marker = self.current_stop.mile_marker
+        if self.danger_mile is not None and trail.hazard_sum[mile_marker + 1] > trail.hazard_sum[mile_marker]:
+            if mile_marker < self.danger_mile:
+                return progress, travel_delay
+            self.danger_mile = None
+            forced = self.first_danger(dangers)
+
+        for i, danger in enumerate(dangers):
+            if forced is not None and i < forced:
+                continue
+            if i == forced or self.danger_strikes(danger['probability']):
                 # mon dieu! Disaster strikes!
                 # print 'Sacre bleu, disaster has struck!'
                 # print 'Bad news, it\'s ' + danger['name']
-                victim = choice(self.living_members.values())
+                victim = self.victims.choice(self.living_members.values())
                 # print 'Poor ' + victim.name
                 mu, sig = danger['severity']
-                severity = int(round(sample_gamma(mu, sig)))
+                severity = int(round(self.sample_severity(mu, sig)))
                 travel_delay = danger['travel delay']
                 if danger['affliction']:
                     # it's an affliction - give it to the victim and continue travel
-                    if danger['affliction'] not in victim.afflictions:
-                        victim.afflicitons[danger['name']] = Affliction({'name': danger['name'], 'severity': severity})
+                    if not victim.has_affliction(danger['name']):
+                        victim.add_affliction(danger['name'], severity)
                     else:
                         1
                         # print 'Lucky you, you can\'t get ' + danger['name'] + ' twice.'
@@ -367,25 +438,111 @@ class Party():
                     # print 'Ouch!', health_before, '-->', victim.health
                     break
 
-        if progress:
-            mile_marker = self.current_stop.mile_marker
-            self.current_stop = trail.path[mile_marker + 1]
+        return progress, travel_delay
 
-            if isinstance(self.current_stop, (River, Town)):
-                # arrived at next major stop
-                # print 'Arrived at ' + self.current_stop.name
-                1
-                if isinstance(self.current_stop, River):
-                    # print 'River conditions (width, depth) = ' + str(self.current_stop.river_state(date_and_time))
-                    1
-                self.last_major_stop = self.current_stop
-                self.next_major_stop = trail.next_major_stop(self.current_stop.mile_marker)
 
-        elapsed_time = travel_time + travel_delay
+    def danger_strikes(self, probability):
+        if self.tilt is None:
+            return self.dangers.uniform() < probability
 
-        self.update_party(elapsed_time)
+        tilted_probability = self.tilt.probability(probability)
+        strikes = self.dangers.uniform() < tilted_probability
+        self.log_weight += self.tilt.roll_log_ratio(probability, tilted_probability, strikes)
+        return strikes
 
-        return elapsed_time, events
+
+    def sample_severity(self, mean, std):
+        if self.tilt is None:
+            return sample_gamma(mean, std, stream=self.severities)
+
+        severity, log_ratio = self.tilt.severity(mean, std, self.severities)
+        self.log_weight += log_ratio
+        return severity
+
+
+    def first_danger(self, dangers):
+        # index of the first danger to strike, given that at least one does
+        quiet_all = 1.0
+        for danger in dangers:
+            quiet_all *= 1.0 - danger['probability']
+
+        u = self.dangers.uniform() * (1.0 - quiet_all)
+        quiet = 1.0
+        for i, danger in enumerate(dangers):
+            quiet *= 1.0 - danger['probability']
+            if 1.0 - quiet > u:
+                return i
+
+        return len(dangers) - 1
+
+
+    def leap(self, trail):
+        """
+        Event-driven travel: cross the run of quiet miles ahead in one step instead of one mile per update. The first
+        mile on which a danger strikes is drawn geometrically, by inverting the trail's cumulative danger hazard with one
+        uniform. The party then moves up to that mile, the next major stop or choice, or the mile on which a member would
+        die, whichever comes first, with health and weariness worked out in closed form (Member.advance). Those are
+        stepped mile by mile as usual.
+
+        The draw (danger_mile) is kept until the party travels its mile. Where the party stops short of it, the draw has
+        already shown the miles in between to be quiet, and drawing again, or rolling them again when stepping, would
+        count dangers on them twice.
+
+        The danger hazard is the terrain's own, so a party under importance sampling (tilt) always steps.
+
+        Returns: (hours elapsed, the events of one quiet mile of travel, miles crossed), or None if the party has to step
+        -------
+        """
+        mile_marker = self.current_stop.mile_marker
+        end = trail.quiet_until[mile_marker]
+        if end == mile_marker or self.tilt is not None:
+            return None
+
+        if self.danger_mile is None:
+            threshold = trail.hazard_sum[mile_marker] - math.log(1.0 - self.dangers.uniform())
+            self.danger_mile = bisect_right(trail.hazard_sum, threshold) - 1
+        stop = min(self.danger_mile, end)
+
+        # mile lengths are cost / speed, and nothing changes the party's speed on quiet miles
+        self.travel_speed()
+        hours_per_mile = self.hours_per_mile
+        members = self.living_members.values()
+
+        def hours_to(mm):
+            hours = (trail.cost_sum[mm] - trail.cost_sum[mile_marker]) * hours_per_mile
+            square_hours = (trail.cost_square_sum[mm] - trail.cost_square_sum[mile_marker]) * hours_per_mile ** 2
+            return hours, square_hours
+
+        def anyone_dies(mm):
+            hours, square_hours = hours_to(mm)
+            return min([member.health_after(hours, square_hours) for member in members]) <= 0
+
+        if anyone_dies(stop):
+            # health can only rise and then fall along the way, so the miles that kill someone come last
+            low, high = mile_marker, stop
+            while high - low > 1:
+                mid = (low + high) // 2
+                if anyone_dies(mid):
+                    high = mid
+                else:
+                    low = mid
+            stop = low
+
+        if stop == mile_marker:
+            return None
+
+        hours, square_hours = hours_to(stop)
+        for member in members:
+            member.advance(hours, square_hours)
+
+        self.action = 'travel'
+        self.current_stop = trail.path[stop]
+        if isinstance(self.current_stop, (River, Town)):
+            self.last_major_stop = self.current_stop
+            self.next_major_stop = trail.next_major_stop(self.current_stop.mile_marker)
+        self.update_condition()
+
+        return hours, {'bear attack': False}, stop - mile_marker
 
 
     def update_party(self, elapsed_time):
@@ -396,7 +553,7 @@ class Party():
         self.update_condition()
 
 
-    def ford(self, trail, date_and_time):
+    def ford(self, trail, hours):
         """
         Simulate fording a river. It takes one day. Update the condition of the party.
 
@@ -411,9 +568,9 @@ class Party():
         # fording can succeed, in which case advacne one mile and take 1 day
 
         # decide if fording will succeed or fail
-        ford_failure = True if uniform() < self.current_stop.ford_failure_rate(date_and_time) else False
+        ford_failure = True if self.crossings.uniform() < self.current_stop.ford_failure_rate(self.calendar.day(hours)) else False
         # decide how much food is lost by fording
-        lost_food = self.total_inventory('food') * (1.0 if uniform() < self.current_stop.ford_food_loss_fraction(date_and_time) else 0.0)
+        lost_food = self.total_inventory('food') * (1.0 if self.crossings.uniform() < self.current_stop.ford_food_loss_fraction(self.calendar.day(hours)) else 0.0)
 
         # made it across, so advance the party        
         if not ford_failure:            
@@ -441,28 +598,22 @@ class Party():
 
 
     def update_food(self, amount):
-        # take it out a pound at a time round-robin style (stop at zero)
-        delta = 0
-        continue_update = True
-        while continue_update:
-            for member in self.living_members.values():
-                if sign(amount) > 0:
-                    member.inventory['food'] += 1
-                    delta += 1
-                elif sign(amount) < 0:
-                    if member.inventory['food'] > 0:
-                        member.inventory['food'] += -1
-                        delta += 1
-                else:
-                    # amount == 0
-                    continue_update = False
-
-                if delta == abs(amount):
-                    continue_update = False
-                    break
-
-
-    def caulk(self, trail, date_and_time):
+        # a pound at a time round-robin style (stop at zero), worked out in closed form
+        self.speed = None
+        members = self.living_members.values()
+        if amount > 0:
+            shares = round_robin_add(len(members), amount)
+            for member, share in zip(members, shares):
+                member.food += share
+            self.food_total += sum(shares)
+        elif amount < 0:
+            shares = round_robin_take([member.food for member in members], -amount)
+            for member, share in zip(members, shares):
+                member.food -= share
+            self.food_total -= sum(shares)
+
+
+    def caulk(self, trail, hours):
         """
         Simulate caulking to cross a river. It takes one day. Update the condition of the party.
 
@@ -477,9 +628,9 @@ class Party():
         # caulking can succeed, in which case advacne one mile and take 1 day
 
         # decide if caulking will succeed or fail
-        caulk_failure = True if uniform() < self.current_stop.caulk_failure_rate(date_and_time) else False
+        caulk_failure = True if self.crossings.uniform() < self.current_stop.caulk_failure_rate(self.calendar.day(hours)) else False
         # decide how much food is lost by fording
-        lost_food = self.total_inventory['food'] * (1.0 if uniform() < self.current_stop.caulk_food_loss_fraction(date_and_time) else 0.0)
+        lost_food = self.total_inventory['food'] * (1.0 if self.crossings.uniform() < self.current_stop.caulk_food_loss_fraction(self.calendar.day(hours)) else 0.0)
 
         # made it across, so advance the party        
         if not caulk_failure:            
@@ -0,0 +1,87 @@
+from timeit import default_timer
+
+
+class Profiler():
+    """
+    Opt-in instrumentation for World.update: call counts and cumulative wall time, keyed by (group, name).
+
+    World.update times its phases ('decide', 'party update', 'bookkeeping'), each action and the kind of stop the step
+    started at. instrument() also wraps the hot spots nested inside an update - danger sampling in Party.travel and
+    river conditions - on the instances of one world only, so nothing is timed, or even checked, when profiling is off.
+    """
+    def __init__(self):
+        # (group, name) --> [calls, seconds]
+        self.timings = dict()
+        # stop class --> its timed subclass, see timed_class
+        self.timed_classes = dict()
+
+
+    def record(self, group, name, seconds):
+        timing = self.timings.get((group, name))
+        if timing is None:
+            self.timings[(group, name)] = [1, seconds]
+        else:
+            timing[0] += 1
+            timing[1] += seconds
+
+
+    def timed(self, group, name, function):
+        # a stand-in for function that records each call
+        def wrapper(*args, **kwargs):
+            start = default_timer()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(group, name, default_timer() - start)
+
+        return wrapper
+
+
+    def instrument(self, world):
+        party = world.party
+        party.encounter_dangers = self.timed('hot spot', 'danger sampling', party.encounter_dangers)
+
+        # stops have __slots__, so a river is switched to a subclass that times its conditions instead
+        trail = world.trail
+        for mile_marker in getattr(trail, 'river_mile_markers', list()):
+            river = trail.path[mile_marker]
+            river.__class__ = self.timed_class(river.__class__)
+
+
+    def timed_class(self, stop_class):
+        # a subclass of stop_class, under the same name and with the same slots, whose conditions() is timed
+        timed_class = self.timed_classes.get(stop_class)
+        if timed_class is None:
+            conditions = self.timed('hot spot', 'river conditions', stop_class.conditions)
+            timed_class = type(stop_class.__name__, (stop_class,), {'__slots__': (), 'conditions': conditions})
+            self.timed_classes[stop_class] = timed_class
+
+        return timed_class
+
+
+    def merge(self, timings):
+        """
+        Add timings from another profiler, e.g. one run in a worker process, given as returned by as_list().
+        """
+        for group, name, calls, seconds in timings:
+            timing = self.timings.setdefault((group, name), [0, 0.0])
+            timing[0] += calls
+            timing[1] += seconds
+
+
+    def as_list(self):
+        # plain (group, name, calls, seconds) tuples, cheap to send between processes
+        return [(group, name, calls, seconds) for (group, name), (calls, seconds) in self.timings.iteritems()]
+
+
+    def print_summary(self):
+        total = sum([seconds for (group, name), (calls, seconds) in self.timings.iteritems() if group == 'phase'])
+
+        print 'profile of World.update (' + '%.3f' % total + ' s in total):'
+        print '  %-12s %-20s %12s %12s %10s %8s' % ('group', 'name', 'calls', 'seconds', 'us/call', 'share')
+        for group in ('phase', 'action', 'stop kind', 'hot spot'):
+            for name in sorted([n for g, n in self.timings if g == group]):
+                calls, seconds = self.timings[(group, name)]
+                share = 100.0 * seconds / total if total > 0 else 0.0
+                print '  %-12s %-20s %12d %12.3f %10.2f %7.1f%%' % (group, name, calls, seconds,
+                                                                  1e6 * seconds / calls, share)
@@ -0,0 +1,187 @@
+import json
+import os.path
+
+import numpy
+
+# events counted per trial, from World.event_counter
+EVENT_NAMES = ('bear attack', 'failed to ford', 'failed to caulk')
+
+SURVIVED = 'survived'
+
+
+class ResultsWriter():
+    """
+    Streams per-trial outcomes to disk as they arrive. Records are fixed-size binary rows (a NumPy structured dtype) in
+    file_name, described by a JSON header in file_name + '.json'. Rows are buffered and appended every flush_every
+    trials, so a run that dies keeps everything up to its last flush.
+
+    Each row holds the number of survivors, the travel time in seconds, a count of each event in EVENT_NAMES, and a
+    cause of death code for each member (0 for survived, see the header's 'causes').
+    """
+    def __init__(self, file_name, members, flush_every=1000, event_names=EVENT_NAMES):
+        self.file_name = file_name
+        self.header_file_name = file_name + '.json'
+        self.members = members
+        self.event_names = list(event_names)
+        self.flush_every = flush_every
+
+        fields = [('survivors', numpy.int16), ('travel time', numpy.float64)]
+        fields += [(name, numpy.int32) for name in self.event_names]
+        fields += [('cause of death', numpy.int16, (members,))]
+        self.dtype = numpy.dtype(fields)
+
+        self.causes = [SURVIVED]
+        self.cause_codes = {SURVIVED: 0}
+
+        self.buffer = numpy.zeros(flush_every, dtype=self.dtype)
+        self.buffered = 0
+        self.trials = 0
+
+        # start a fresh file
+        open(self.file_name, 'wb').close()
+        self.write_header()
+
+
+    def write_header(self):
+        header = {'format': 'tort results',
+                  'version': 1,
+                  'fields': [[name] + list(spec) for name, spec in zip(self.dtype.names, self.field_specs())],
+                  'members': self.members,
+                  'events': self.event_names,
+                  'causes': self.causes,
+                  'trials': self.trials}
+
+        # write then rename, so a crash never leaves a half-written header
+        with open(self.header_file_name + '.tmp', 'w') as header_file:
+            json.dump(header, header_file)
+        os.rename(self.header_file_name + '.tmp', self.header_file_name)
+
+
+    def field_specs(self):
+        specs = list()
+        for name in self.dtype.names:
+            field_dtype = self.dtype.fields[name][0]
+            if field_dtype.subdtype is not None:
+                specs.append([field_dtype.subdtype[0].str, list(field_dtype.subdtype[1])])
+            else:
+                specs.append([field_dtype.str])
+        return specs
+
+
+    def cause_code(self, cause):
+        if cause is None:
+            return 0
+        elif cause not in self.cause_codes:
+            self.cause_codes[cause] = len(self.causes)
+            self.causes.append(cause)
+        return self.cause_codes[cause]
+
+
+    def write(self, result):
+        """
+        Add one trial, a dict with 'survivors', 'travel time', 'events' (event name --> count) and 'causes of death' (one
+        cause or None per member).
+        """
+        row = self.buffer[self.buffered]
+        row['survivors'] = result['survivors']
+        row['travel time'] = result['travel time']
+        for name in self.event_names:
+            row[name] = result['events'].get(name, 0)
+        row['cause of death'] = [self.cause_code(cause) for cause in result['causes of death']]
+
+        self.buffered += 1
+        if self.buffered == self.flush_every:
+            self.flush()
+
+
+    def write_columns(self, columns):
+        """
+        Add many trials at once, given as columns: 'survivors', 'travel time', 'events' (event name --> counts) and
+        'causes of death' (trials x members, a cause or None each).
+        """
+        trials = len(columns['survivors'])
+        rows = numpy.zeros(trials, dtype=self.dtype)
+        rows['survivors'] = columns['survivors']
+        rows['travel time'] = columns['travel time']
+        for name in self.event_names:
+            rows[name] = columns['events'].get(name, 0)
+        rows['cause of death'] = [[self.cause_code(cause) for cause in causes] for causes in columns['causes of death']]
+
+        self.flush()
+        self.append(rows)
+
+
+    def flush(self):
+        if self.buffered > 0:
+            self.append(self.buffer[:self.buffered])
+            self.buffered = 0
+
+
+    def append(self, rows):
+        with open(self.file_name, 'ab') as results_file:
+            rows.tofile(results_file)
+        self.trials += len(rows)
+        self.write_header()
+
+
+    def close(self):
+        self.flush()
+
+
+
+def read_header(file_name):
+    with open(file_name + '.json', 'r') as header_file:
+        header = json.load(header_file)
+
+    fields = list()
+    for field in header['fields']:
+        if len(field) == 3:
+            fields.append((str(field[0]), str(field[1]), tuple(field[2])))
+        else:
+            fields.append((str(field[0]), str(field[1])))
+
+    return header, numpy.dtype(fields)
+
+
+def read_results(file_name, chunk_size=100000):
+    """
+    Iterate over the rows of a results file in chunks of at most chunk_size trials. Only the trials counted in the
+    header are read, so a partly written last chunk is ignored.
+    """
+    header, dtype = read_header(file_name)
+    rows = numpy.memmap(file_name, dtype=dtype, mode='r', shape=(header['trials'],)) if header['trials'] else []
+
+    for start in range(0, header['trials'], chunk_size):
+        yield numpy.array(rows[start:start + chunk_size])
+
+
+def summarize_results(file_name, chunk_size=100000):
+    """
+    Totals over every trial in a results file, read chunk by chunk so memory stays bounded.
+
+    Returns: dict with 'trials', 'survivors', 'travel time' and 'bear attacks' totals, 'events' (event name --> total)
+    and 'deaths' (cause --> number of members)
+    -------
+    """
+    header, dtype = read_header(file_name)
+
+    totals = {'trials': 0, 'survivors': 0, 'travel time': 0.0,
+              'events': dict([(name, 0) for name in header['events']]),
+              'deaths': dict()}
+    deaths = numpy.zeros(len(header['causes']), dtype=int)
+
+    for rows in read_results(file_name, chunk_size):
+        totals['trials'] += len(rows)
+        totals['survivors'] += int(rows['survivors'].sum())
+        totals['travel time'] += float(rows['travel time'].sum())
+        for name in header['events']:
+            totals['events'][name] += int(rows[name].sum())
+        deaths += numpy.bincount(rows['cause of death'].ravel(), minlength=len(header['causes']))
+
+    for code, cause in enumerate(header['causes']):
+        if cause != SURVIVED and deaths[code] > 0:
+            totals['deaths'][cause] = int(deaths[code])
+
+    totals['bear attacks'] = totals['events'].get('bear attack', 0)
+
+    return totals
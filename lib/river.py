@@ -1,11 +1,20 @@
-from stop import Stop
+from bisect import bisect_right
+from collections import OrderedDict
+
+from stop import Stop, shared_actions
+from terrain import terrain_section
 from util import *
+from rng import streams
 from numpy import power
 
+# number of days of river conditions each river remembers
+RIVER_CACHE_DAYS = 32
+
 class River(Stop):
     '''
     River is a special stop along the trail where the party must choose an alternate travel method
     '''
+    __slots__ = ('history', 'stage_days', 'stage_widths', 'stage_depths', 'conditions_cache')
 
     def __init__(self, name='river', mile_marker=None, add_actions=None, rem_actions=None, properties=None):
         Stop.__init__(self)
@@ -33,12 +42,14 @@ class River(Stop):
 
         self.actions.update(set(add_actions))
         self.actions.difference_update(set(rem_actions))
+        self.actions = shared_actions(self.actions)
 
         if 'travel' in self.actions:
             print 'WARNING - River stop allows "travel" action: ' + str(self)
 
-        self.properties.update(properties)
+        self.properties = terrain_section(properties)
         self.history = None
+        self.conditions_cache = OrderedDict()
 
 
     def initialize_river_state(self, year):
@@ -57,6 +68,7 @@ class River(Stop):
         # k = mean^2/var
 
         # create flood crest / low point history for last year, this, and next
+        stream = streams.stream('rivers')
         self.history = dict()
         mean_flood_width, std_flood_width = map(float, self.properties['river']['flood width'])
         mean_flood_depth, std_flood_depth = map(float, self.properties['river']['flood depth'])
@@ -64,104 +76,144 @@ class River(Stop):
         mean_low_depth,   std_low_depth   = map(float, self.properties['river']['low depth'])
 
         for i in [-1, 0, 1]:
-            flood_width = sample_gamma(mean_flood_width, std_flood_width)
-            flood_depth = sample_gamma(mean_flood_depth, std_flood_depth)
+            flood_width = sample_gamma(mean_flood_width, std_flood_width, stream=stream)
+            flood_depth = sample_gamma(mean_flood_depth, std_flood_depth, stream=stream)
             flood = {'condition': 'flood',  'width': flood_width, 'depth': flood_depth}
-            self.history[random_date_in_season(year + i, self.properties['river']['flood stage'])] = flood
+            self.history[random_date_in_season(year + i, self.properties['river']['flood stage'], stream)] = flood
 
-            low_width = sample_gamma(mean_low_width, std_low_width)
-            low_depth = sample_gamma(mean_low_depth, std_low_depth)
+            low_width = sample_gamma(mean_low_width, std_low_width, stream=stream)
+            low_depth = sample_gamma(mean_low_depth, std_low_depth, stream=stream)
             low = {'condition': 'low',  'width': low_width, 'depth': low_depth}
-            self.history[random_date_in_season(year + i, self.properties['river']['low stage'])] = low
+            self.history[random_date_in_season(year + i, self.properties['river']['low stage'], stream)] = low
+
+        # the same history as a timeline of day numbers, sorted once here so that lookups can bisect it
+        stage_dates = sorted(self.history.keys())
+        self.stage_days = [stage_date.toordinal() for stage_date in stage_dates]
+        self.stage_widths = [self.history[stage_date]['width'] for stage_date in stage_dates]
+        self.stage_depths = [self.history[stage_date]['depth'] for stage_date in stage_dates]
+
+        self.conditions_cache = OrderedDict()
+
 
+    def river_state(self, day):
+        conditions = self.conditions(day)
+        return (conditions['width'], conditions['depth'])
 
-    def river_state(self, date):
+
+    def conditions(self, day):
+        """
+        River width and depth on day (a day number, as from date.toordinal() or clock.Calendar.day), and the crossing
+        rates that follow from them. Each day is worked out once and remembered; the least recently used day is
+        forgotten once RIVER_CACHE_DAYS are held.
+        """
         if self.history is None:
-            self.initialize_river_state(date.year)
-            
- 
-        last_stage_date = None
-        last_stage = None
-        for stage_date, stage in self.history.iteritems():
-            if last_stage_date is not None:
-                if last_stage_date <= date <= stage_date:
-                    # linear interpolation of conditions
-                    fraction = float((date - last_stage_date).days) / float((stage_date - last_stage_date).days)
-                    width = fraction * abs(stage['width'] - last_stage['width'])
-                    depth = fraction * abs(stage['depth'] - last_stage['depth'])
-                    break
-
-            last_stage_date = date
-            last_stage = stage
-
-        # tempting fate here on purpose - there's a chance that the date isn't found in an interval in the history
-        # hopfully this will cause an exception because widht and depth aren't defined here, and I can revisit
-        # the river_state_initialization code.
+            self.initialize_river_state(datetime.fromordinal(day).year)
+
+        conditions = self.conditions_cache.pop(day, None)
+        if conditions is None:
+            width, depth = self.interpolate_stages(day)
+            conditions = {'width': width,
+                          'depth': depth,
+                          'ford failure rate': ford_failure_rate(width, depth),
+                          'ford food loss fraction': ford_food_loss_fraction(width, depth),
+                          'caulk failure rate': caulk_failure_rate(width, depth),
+                          'caulk food loss fraction': caulk_food_loss_fraction(width, depth)}
+
+            if len(self.conditions_cache) >= RIVER_CACHE_DAYS:
+                self.conditions_cache.popitem(last=False)
+
+        # the most recently used day goes (back) to the end
+        self.conditions_cache[day] = conditions
+
+        return conditions
+
+
+    def interpolate_stages(self, day):
+        # linear interpolation of conditions between the stages either side of day
+        i = bisect_right(self.stage_days, day)
+        if i == len(self.stage_days) and day == self.stage_days[-1]:
+            return (self.stage_widths[-1], self.stage_depths[-1])
+        elif i == 0 or i == len(self.stage_days):
+            raise ValueError('ERROR - date is outside the river history: ' + str(datetime.fromordinal(day)))
+
+        fraction = float(day - self.stage_days[i - 1]) / float(self.stage_days[i] - self.stage_days[i - 1])
+        width = self.stage_widths[i - 1] + fraction * (self.stage_widths[i] - self.stage_widths[i - 1])
+        depth = self.stage_depths[i - 1] + fraction * (self.stage_depths[i] - self.stage_depths[i - 1])
+
         return (width, depth)
 
 
-    def ford_failure_rate(self, date):
-        # automaticall fails if above 5 feet, otherwise linear interpolate down to zero
-        # every 100 feet of width increases failure rate by 10%
-        (width, depth) = self.river_state(date)
-        max_d = 5.0
-        min_d = 0.0
-        if min_d <= depth <= max_d:
-            failure_rate = min((depth - min_d)/(max_d - min_d) * power(1.1, width/100.0), 1.0)
-        else:
-            failure_rate = 1.0
-        
-        return failure_rate        
-        
-        
-    def ford_food_loss_fraction(self, date):
-        # automaticall fails if above 5 feet, otherwise linear interpolate down to 1 foot
-        # every 100 feet of width increases failure rate by 10%
-        (width, depth) = self.river_state(date)
-        max_d = 5.0
-        min_d = 1.0
-        if depth < 2.0:
-            lost_food_fraction = 0.0
-        else:
-            lost_food_fraction = min((depth - min_d)/(max_d - min_d) * power(1.1, width/100.0), 1.0)
-        
-        return lost_food_fraction      
-        
-
-    def caulk_failure_rate(self, date):
-        # automatically fails if above 8 feet, otherwise linear interpolate down to two feet
-        # automatically fails if below two feet (too shallow)
-        # every 100 feet of width increases failure rate by 10%
-        (width, depth) = self.river_state(date)
-        max_d = 8.0
-        min_d = 2.0
-
-        if min_d <= depth <= max_d:
-            failure_rate = min((depth - min_d)/(max_d - min_d) * power(1.1, width/100.0), 1.0)
-        else:
-            failure_rate = 1.0
-            
-        return failure_rate        
-        
-        
-    def caulk_food_loss_fraction(self, date):
-        # automaticall fails if above 8 feet, otherwise linear interpolate down to 2 foot
-        # every 100 feet of width increases failure rate by 10%
-        (width, depth) = self.river_state(date)
-        max_d = 8.0
-        min_d = 2.0
-
-        if min_d <= depth <= max_d:
-            lost_food_fraction = min((depth - min_d)/(max_d - min_d) * power(1.1, width/100.0), 1.0)
-        elif depth < min_d:
-            lost_food_fraction = 0.0
-        elif max_d < depth:
-            lost_food_fraction = 1.0
-        else:
-            raise ValueError('ERROR - this clause cannot be reached.')
-        
-        return lost_food_fraction      
+    def ford_failure_rate(self, day):
+        return self.conditions(day)['ford failure rate']
+
+
+    def ford_food_loss_fraction(self, day):
+        return self.conditions(day)['ford food loss fraction']
+
+
+    def caulk_failure_rate(self, day):
+        return self.conditions(day)['caulk failure rate']
+
+
+    def caulk_food_loss_fraction(self, day):
+        return self.conditions(day)['caulk food loss fraction']
+
+
+
+def ford_failure_rate(width, depth):
+    # automaticall fails if above 5 feet, otherwise linear interpolate down to zero
+    # every 100 feet of width increases failure rate by 10%
+    max_d = 5.0
+    min_d = 0.0
+    if min_d <= depth <= max_d:
+        failure_rate = min((depth - min_d)/(max_d - min_d) * power(1.1, width/100.0), 1.0)
+    else:
+        failure_rate = 1.0
+
+    return failure_rate
+
+
+def ford_food_loss_fraction(width, depth):
+    # automaticall fails if above 5 feet, otherwise linear interpolate down to 1 foot
+    # every 100 feet of width increases failure rate by 10%
+    max_d = 5.0
+    min_d = 1.0
+    if depth < 2.0:
+        lost_food_fraction = 0.0
+    else:
+        lost_food_fraction = min((depth - min_d)/(max_d - min_d) * power(1.1, width/100.0), 1.0)
+
+    return lost_food_fraction
+
+
+def caulk_failure_rate(width, depth):
+    # automatically fails if above 8 feet, otherwise linear interpolate down to two feet
+    # automatically fails if below two feet (too shallow)
+    # every 100 feet of width increases failure rate by 10%
+    max_d = 8.0
+    min_d = 2.0
+
+    if min_d <= depth <= max_d:
+        failure_rate = min((depth - min_d)/(max_d - min_d) * power(1.1, width/100.0), 1.0)
+    else:
+        failure_rate = 1.0
+
+    return failure_rate
 
 
+def caulk_food_loss_fraction(width, depth):
+    # automaticall fails if above 8 feet, otherwise linear interpolate down to 2 foot
+    # every 100 feet of width increases failure rate by 10%
+    max_d = 8.0
+    min_d = 2.0
 
+    if min_d <= depth <= max_d:
+        lost_food_fraction = min((depth - min_d)/(max_d - min_d) * power(1.1, width/100.0), 1.0)
+    elif depth < min_d:
+        lost_food_fraction = 0.0
+    elif max_d < depth:
+        lost_food_fraction = 1.0
+    else:
+        raise ValueError('ERROR - this clause cannot be reached.')
 
+    return lost_food_fraction
@@ -0,0 +1,93 @@
+import zlib
+
+import numpy
+
+# how many variates each stream draws from NumPy at a time
+UNIFORM_BLOCK_SIZE = 1024
+GAMMA_BLOCK_SIZE = 64
+
+
+class RandomStream():
+    """
+    One stream of random numbers, drawn from its own numpy RandomState in blocks and handed out one at a time. A scalar
+    call into numpy.random costs about as much as drawing a few hundred variates, so the simulation's one-at-a-time
+    draws (danger rolls, victims, severities) are much cheaper out of a block.
+    """
+    def __init__(self, seed=None):
+        self.state = numpy.random.RandomState(seed)
+
+        self.uniforms = list()
+        self.next_uniform = 0
+
+        # shape --> [block of standard gamma variates, index of the next one]
+        self.gammas = dict()
+
+
+    def uniform(self):
+        # uniform on [0, 1)
+        i = self.next_uniform
+        if i == len(self.uniforms):
+            self.uniforms = self.state.random_sample(UNIFORM_BLOCK_SIZE).tolist()
+            i = 0
+        self.next_uniform = i + 1
+
+        return self.uniforms[i]
+
+
+    def randint(self, low, high):
+        # integer in [low, high), like numpy.random.randint
+        if high <= low:
+            raise ValueError('ERROR - empty range for randint: ' + str((low, high)))
+
+        return low + int(self.uniform() * (high - low))
+
+
+    def choice(self, sequence):
+        return sequence[int(self.uniform() * len(sequence))]
+
+
+    def gamma(self, shape, scale=1.0):
+        # gamma(k, theta) is theta times a standard gamma(k), so blocks are kept per shape
+        block = self.gammas.get(shape)
+        if block is None or block[1] == len(block[0]):
+            block = [self.state.standard_gamma(shape, GAMMA_BLOCK_SIZE).tolist(), 0]
+            self.gammas[shape] = block
+        value = block[0][block[1]]
+        block[1] += 1
+
+        return scale * value
+
+
+
+class RandomStreams():
+    """
+    Named random streams for one trial. Each stream is seeded from the trial's key and its own name, so that what one
+    part of the simulation draws never shifts the numbers another part sees, and a trial is reproducible from its key
+    alone. Streams are created on first use after each seed().
+    """
+    def __init__(self):
+        self.key = None
+        self.streams = dict()
+
+
+    def seed(self, *key):
+        """
+        Start fresh streams for key, e.g. (seed, trial). With no key, streams are seeded from the OS.
+        """
+        self.key = [int(k) & 0xffffffff for k in key] if key else None
+        self.streams = dict()
+
+
+    def stream(self, name):
+        stream = self.streams.get(name)
+        if stream is None:
+            seed = None if self.key is None else self.key + [zlib.crc32(name) & 0xffffffff]
+            stream = RandomStream(seed)
+            self.streams[name] = stream
+
+        return stream
+
+
+
+# the streams the simulation draws from, seeded per trial by runner.seed_trial
+streams = RandomStreams()
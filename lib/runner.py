@@ -0,0 +1,281 @@
+import os
+import json
+import math
+import random
+import multiprocessing
+
+import numpy
+
+from lib.trail import Trail
+from lib.compiled import CompiledTrail
+from lib.party import Party
+from lib.world import World
+from lib.profiling import Profiler
+from lib.rng import streams
+from lib.batch import BatchSimulation
+
+
+STAT_NAMES = ['survivors', 'travel time', 'bear attacks']
+
+# trails are parsed once per process and shared by every trial that process runs
+_trail_templates = dict()
+
+
+def new_seed():
+    """
+    Draw a fresh base seed from the OS. It is printed by main.py so that a run can be repeated with --seed.
+    """
+    return int(numpy.frombuffer(os.urandom(4), dtype=numpy.uint32)[0])
+
+
+def seed_trial(seed, trial):
+    """
+    Seed the random generators for one trial: the simulation's named streams (rng.streams) and the global ones. The
+    streams depend only on (seed, trial), so a trial draws the same numbers no matter which worker process runs it or
+    how many workers there are.
+    """
+    streams.seed(seed, trial)
+    numpy.random.seed([seed, trial])
+    random.seed((seed, trial))
+
+
+def trail_template(scenario):
+    """
+    Return this process's shared Trail for the scenario's trail and terrain files, building it on first use. A
+    scenario with a 'compiled trail' (see compiled.compile_trail) loads that instead.
+    """
+    compiled = scenario.get('compiled trail')
+    key = compiled if compiled is not None else (scenario['trail file'], scenario['terrain file'])
+    if key not in _trail_templates:
+        if compiled is not None:
+            _trail_templates[key] = CompiledTrail(scenario['start datetime'], compiled)
+        else:
+            _trail_templates[key] = Trail(scenario['start datetime'], scenario['trail file'], scenario['terrain file'])
+
+    return _trail_templates[key]
+
+
+def scenario_size(scenario):
+    """
+    The length of the scenario's trail, from its first mile marker to its last, and the number of members its party
+    sets out with, which the per-mile statistics and HARM are worked out from (see stats.TrialStatistics).
+
+    Returns: (trail miles, party size)
+    -------
+    """
+    trail = trail_template(scenario)
+    with open(scenario['party file'], 'r') as party_file:
+        party_size = len(json.load(party_file)['members'])
+
+    return trail.last_mile_marker - trail.first_mile_marker, party_size
+
+
+def run_trial(scenario, seed, trial, profile=False):
+    """
+    Simulate one party from the start of the trail until it arrives or dies.
+
+    Returns: dict of per-trial stats keyed by STAT_NAMES, and the trial's importance sampling 'weight' (1 unless the
+    scenario has a 'tilt', see importance.DangerTilt); with profile, also the trial's World.update timings under
+    'profile'
+    -------
+    """
+    template = trail_template(scenario)
+    seed_trial(seed, trial)
+
+    start_datetime = scenario['start datetime']
+    trail = template.trial_view(start_datetime)
+    party = Party(start_datetime, scenario['party file'], trail, scenario.get('tilt'))
+    profiler = Profiler() if profile else None
+    world = World(start_datetime, party, trail, profiler, scenario.get('event driven', False))
+
+    # simulate until destination or death
+    while world.party.condition not in ('arrived', 'dead'):
+        world.update(scenario['strategy'])
+
+    result = {'survivors': world.party.number_alive(),
+              'travel time': world.hours * 60.0 * 60.0,
+              'bear attacks': world.event_counter.get('bear attack', dict()).get(True, 0),
+              'events': dict([(event, counts.get(True, 0)) for event, counts in world.event_counter.iteritems()]),
+              'causes of death': world.party.causes_of_death(),
+              'weight': math.exp(world.party.log_weight)}
+    if profiler is not None:
+        result['profile'] = profiler.as_list()
+
+    return result
+
+
+def _run_trial_task(task):
+    # Pool.imap passes a single argument
+    return run_trial(*task)
+
+
+def run_paired_trial(scenarios, seed, trial):
+    """
+    Run the same trial of several variants of a scenario, each on the (seed, trial) random streams, so that the variants
+    see the same river histories, danger rolls, victims and severities: common random numbers.
+
+    Returns: list of per-trial stats, one per scenario, as run_trial
+    -------
+    """
+    return [run_trial(scenario, seed, trial) for scenario in scenarios]
+
+
+def _run_paired_trial_task(task):
+    return run_paired_trial(*task)
+
+
+def run_paired_trials(scenarios, trials, seed, workers=1, monitor=None):
+    """
+    Like run_trials, for several variants of a scenario at once: each trial runs every variant (run_paired_trial), so
+    differences between the variants can be estimated trial by trial. A monitor (stats.PairedStatistics) is updated with
+    every trial's list of results.
+
+    Returns: list of dicts of stat name --> list of per-trial values, one per scenario
+    -------
+    """
+    tasks = ((scenarios, seed, t) for t in xrange(trials))
+    chunk_size = max(1, min(trials // (4 * workers), 1000))
+    if monitor is not None:
+        chunk_size = min(chunk_size, 10)
+    results = imap_tasks(_run_paired_trial_task, tasks, workers, chunk_size)
+
+    collected = [list() for scenario in scenarios]
+    for result in results:
+        for variant, variant_result in zip(collected, result):
+            variant.append(variant_result)
+
+        if monitor is not None:
+            monitor.update(result)
+            if monitor.converged():
+                results.close()
+                break
+
+    return [merge_stats(variant) for variant in collected]
+
+
+def imap_tasks(function, tasks, workers, chunk_size=1):
+    """
+    Yield function(task) for each task, in order, as the results come in. With more than one worker the tasks run in a
+    process pool, which is shut down when the results run out or the caller stops asking for them.
+    """
+    if workers < 1:
+        raise ValueError('ERROR - number of workers must be at least 1: ' + str(workers))
+
+    if workers == 1:
+        for task in tasks:
+            yield function(task)
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            for result in pool.imap(function, tasks, chunk_size):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+def run_trials(scenario, trials, seed, workers=1, writer=None, monitor=None, profiler=None):
+    """
+    Run a batch of independent trials of a scenario, spreading them over a pool of worker processes when workers > 1.
+
+    scenario is a dict with keys 'start datetime', 'trail file', 'terrain file', 'party file' and 'strategy', and
+    optionally 'event driven' (see World), 'tilt' (see importance.DangerTilt) and 'compiled trail' (see
+    trail_template).
+
+    A monitor (stats.TrialStatistics) is updated as each trial completes, and the run stops early, before trials, once
+    the monitor has converged.
+
+    A profiler (profiling.Profiler) collects the World.update timings of every trial, from whichever process ran it.
+
+    Returns: dict of stat name --> list of per-trial values, in trial order; or, when a results writer is given, None
+    after streaming each trial to the writer as it completes
+    -------
+    """
+    tasks = ((scenario, seed, t, profiler is not None) for t in xrange(trials))
+    # big chunks keep the inter-process traffic small, imap keeps the results in trial order
+    chunk_size = max(1, min(trials // (4 * workers), 1000))
+    if monitor is not None:
+        # small chunks, so that an early stop wastes little work
+        chunk_size = min(chunk_size, 10)
+    results = imap_tasks(_run_trial_task, tasks, workers, chunk_size)
+
+    collected = list()
+    for result in results:
+        if writer is not None:
+            writer.write(result)
+        else:
+            collected.append(result)
+
+        if profiler is not None:
+            profiler.merge(result['profile'])
+
+        if monitor is not None:
+            monitor.update(result)
+            if monitor.converged():
+                results.close()
+                break
+
+    if writer is not None:
+        writer.close()
+    else:
+        return merge_stats(collected)
+
+
+def run_batch(scenario, parties, seed, batch):
+    """
+    Simulate a batch of parties in lockstep with the vectorized engine.
+
+    Returns: dict of stat name --> per-trial values, plus 'events' and 'causes of death' as in run_trial
+    -------
+    """
+    template = trail_template(scenario)
+    seed_trial(seed, batch)
+
+    simulation = BatchSimulation(scenario['start datetime'], scenario['party file'], template, parties,
+                                 scenario['strategy'])
+    return simulation.run()
+
+
+def _run_batch_task(task):
+    return run_batch(*task)
+
+
+def run_batch_trials(scenario, trials, seed, workers=1, batch_size=10000, writer=None, monitor=None):
+    """
+    Like run_trials, but with the vectorized engine: trials are split into batches of up to batch_size parties, and each
+    batch runs on its own (seed, batch) random stream. A monitor is checked after each whole batch.
+    """
+    sizes = [batch_size] * (trials // batch_size) + ([trials % batch_size] if trials % batch_size else [])
+    tasks = [(scenario, size, seed, b) for b, size in enumerate(sizes)]
+    results = imap_tasks(_run_batch_task, tasks, workers)
+
+    stats = dict([(name, list()) for name in STAT_NAMES])
+    for result in results:
+        if writer is not None:
+            writer.write_columns(result)
+        else:
+            for name in STAT_NAMES:
+                stats[name].extend(result[name])
+
+        if monitor is not None:
+            monitor.update_many(result)
+            if monitor.converged():
+                results.close()
+                break
+
+    if writer is not None:
+        writer.close()
+    else:
+        return stats
+
+
+def merge_stats(results):
+    """
+    Collect a sequence of per-trial stats dicts into lists keyed by stat name.
+    """
+    stats = dict([(name, list()) for name in STAT_NAMES])
+    for result in results:
+        for name in STAT_NAMES:
+            stats[name].append(result[name])
+
+    return stats
@@ -0,0 +1,355 @@
+import math
+import random
+
+
+def powells(mortality, trail_miles):
+    return 1.25 * (trail_miles + 4495 / 1000) * (mortality * 2) * 1000.0
+
+
+def harm(mortality, trail_miles):
+    return powells(mortality, trail_miles) / trail_miles
+
+
+def z_score(confidence):
+    """
+    Two-sided standard normal critical value, e.g. 1.96 for 0.95. Found by bisection on math.erf.
+    """
+    if not 0.0 < confidence < 1.0:
+        raise ValueError('ERROR - confidence must be between 0 and 1: ' + str(confidence))
+
+    low, high = 0.0, 40.0
+    for i in range(100):
+        mid = (low + high) / 2.0
+        if math.erf(mid / math.sqrt(2.0)) < confidence:
+            low = mid
+        else:
+            high = mid
+
+    return (low + high) / 2.0
+
+
+class RunningStats():
+    """
+    Mean and variance of a stream of values, updated one value (Welford) or one batch (Chan et al.) at a time.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+
+    def push(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+
+    def push_many(self, values):
+        n = len(values)
+        if n == 0:
+            return
+
+        batch_mean = sum(values) / float(n)
+        batch_m2 = sum([(x - batch_mean) ** 2 for x in values])
+
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+
+    def half_width(self, confidence=0.95):
+        # half the width of the normal-approximation confidence interval for the mean
+        if self.count == 0:
+            return float('inf')
+        return z_score(confidence) * self.std() / math.sqrt(self.count)
+
+
+    def confidence_interval(self, confidence=0.95):
+        h = self.half_width(confidence)
+        return (self.mean - h, self.mean + h)
+
+
+
+class QuantileSketch():
+    """
+    Streaming quantile estimates from a fixed-size uniform sample of the values seen so far (Vitter's algorithm R).
+    Exact until capacity values have arrived, and memory stays bounded after that. Ties, which are common here (most
+    parties lose nobody), are handled exactly.
+    """
+    def __init__(self, capacity=10000, seed=0):
+        self.capacity = capacity
+        self.sample = list()
+        self.count = 0
+        # its own generator, so that sketching never disturbs the simulation's random streams
+        self.random = random.Random(seed)
+
+
+    def push(self, x):
+        self.count += 1
+        if len(self.sample) < self.capacity:
+            self.sample.append(x)
+        else:
+            i = self.random.randint(0, self.count - 1)
+            if i < self.capacity:
+                self.sample[i] = x
+
+
+    def quantile(self, p):
+        if not self.sample:
+            return None
+        ordered = sorted(self.sample)
+        return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+
+
+class TrialStatistics():
+    """
+    Online statistics over completed trials: running mean, variance, confidence interval and quantile sketches for
+    survivors, travel time (hours), bear attacks per mile and HARM. converged() says when every target confidence
+    interval is narrow enough to stop.
+
+    trail_miles and party_size are the length of the trail and the number of members the party sets out with, which the
+    per-mile metrics and HARM are worked out from. targets maps metric name --> largest acceptable full width of its
+    confidence interval.
+    """
+    metrics = ('survivors', 'travel time', 'bears per mile', 'HARM')
+
+    def __init__(self, trail_miles, party_size, targets=None, confidence=0.95, quantiles=(0.05, 0.5, 0.95),
+                 min_trials=100):
+        self.trail_miles = float(trail_miles)
+        self.party_size = float(party_size)
+        self.targets = dict() if targets is None else targets
+        for metric in self.targets:
+            if metric not in self.metrics:
+                raise ValueError('ERROR - unknown metric for early stopping: ' + str(metric))
+
+        self.confidence = confidence
+        self.min_trials = min_trials
+        self.stats = dict([(metric, RunningStats()) for metric in self.metrics])
+        self.quantiles = quantiles
+        self.sketches = dict([(metric, QuantileSketch()) for metric in self.metrics])
+
+
+    def trial_metrics(self, survivors, travel_time, bear_attacks):
+        # per-trial values whose means are the figures main.py reports
+        return {'survivors': survivors,
+                'travel time': travel_time / 60.0 / 60.0,
+                'bears per mile': bear_attacks / self.trail_miles,
+                'HARM': harm(self.party_size - survivors, self.trail_miles)}
+
+
+    def update(self, result):
+        values = self.trial_metrics(result['survivors'], result['travel time'], result['bear attacks'])
+        for metric, value in values.iteritems():
+            self.stats[metric].push(value)
+            self.sketches[metric].push(value)
+
+
+    def update_many(self, columns):
+        values = [self.trial_metrics(*trial) for trial in
+                  zip(columns['survivors'], columns['travel time'], columns['bear attacks'])]
+        for metric in self.metrics:
+            metric_values = [float(v[metric]) for v in values]
+            self.stats[metric].push_many(metric_values)
+            for value in metric_values:
+                self.sketches[metric].push(value)
+
+
+    def trials(self):
+        return self.stats['survivors'].count
+
+
+    def converged(self):
+        if not self.targets or self.trials() < self.min_trials:
+            return False
+
+        for metric, width in self.targets.iteritems():
+            if 2.0 * self.stats[metric].half_width(self.confidence) > width:
+                return False
+
+        return True
+
+
+    def print_summary(self):
+        print 'online statistics after', self.trials(), 'trials (' + str(int(100 * self.confidence)) + '% CI):'
+        for metric in self.metrics:
+            s = self.stats[metric]
+            low, high = s.confidence_interval(self.confidence)
+            quantiles = ', '.join(['q%g=%.4g' % (p, self.sketches[metric].quantile(p)) for p in self.quantiles])
+            print '  %s: mean %.4g [%.4g, %.4g] std %.4g %s' % (metric, s.mean, low, high, s.std(), quantiles)
+
+
+
+class PairedStatistics():
+    """
+    Online statistics for comparing variants of a scenario run on common random numbers (runner.run_paired_trials):
+    the mean difference of each variant from the first, the baseline, in survivors and travel time (hours), with a
+    confidence interval from the per-trial differences. Because the variants share their random draws, the differences
+    vary much less than the outcomes themselves, and the paired interval is narrower than the one independent runs of
+    the same size would give; print_summary() shows both.
+
+    targets maps metric name --> largest acceptable full width of the confidence interval of every difference.
+    """
+    metrics = ('survivors', 'travel time')
+
+    def __init__(self, labels, targets=None, confidence=0.95, min_trials=100):
+        self.labels = labels
+        self.targets = dict() if targets is None else targets
+        for metric in self.targets:
+            if metric not in self.metrics:
+                raise ValueError('ERROR - unknown metric for early stopping: ' + str(metric))
+
+        self.confidence = confidence
+        self.min_trials = min_trials
+        # outcomes of each variant, and differences of each variant from the baseline (none for the baseline itself)
+        self.stats = [dict([(metric, RunningStats()) for metric in self.metrics]) for label in labels]
+        self.differences = [dict([(metric, RunningStats()) for metric in self.metrics]) for label in labels[1:]]
+
+
+    def trial_metrics(self, result):
+        return {'survivors': result['survivors'],
+                'travel time': result['travel time'] / 60.0 / 60.0}
+
+
+    def update(self, results):
+        values = [self.trial_metrics(result) for result in results]
+        for stats, value in zip(self.stats, values):
+            for metric in self.metrics:
+                stats[metric].push(value[metric])
+        for differences, value in zip(self.differences, values[1:]):
+            for metric in self.metrics:
+                differences[metric].push(value[metric] - values[0][metric])
+
+
+    def trials(self):
+        return self.stats[0]['survivors'].count
+
+
+    def independent_half_width(self, variant, metric):
+        # the half width the difference's interval would have if the two variants had been run independently
+        n = self.trials()
+        if n == 0:
+            return float('inf')
+        baseline, other = self.stats[0][metric], self.stats[variant][metric]
+        return z_score(self.confidence) * math.sqrt((baseline.variance() + other.variance()) / n)
+
+
+    def converged(self):
+        if not self.targets or self.trials() < self.min_trials:
+            return False
+
+        for differences in self.differences:
+            for metric, width in self.targets.iteritems():
+                if 2.0 * differences[metric].half_width(self.confidence) > width:
+                    return False
+
+        return True
+
+
+    def print_summary(self):
+        print 'paired differences from', self.labels[0], 'after', self.trials(), 'trials (' + \
+            str(int(100 * self.confidence)) + '% CI):'
+        for variant, differences in enumerate(self.differences, 1):
+            print '  ' + self.labels[variant] + ':'
+            for metric in self.metrics:
+                d = differences[metric]
+                low, high = d.confidence_interval(self.confidence)
+                paired, independent = d.half_width(self.confidence), self.independent_half_width(variant, metric)
+                if paired > 0:
+                    factor = (independent / paired) ** 2
+                else:
+                    factor = float('inf') if independent > 0 else 1.0
+                print '    %s: %+.4g [%.4g, %.4g] half width %.4g; independent runs: %.4g, or %.3g times the trials' \
+                    % (metric, d.mean, low, high, paired, independent, factor)
+
+
+
+class WeightedStatistics():
+    """
+    Online statistics over trials run under importance sampling (importance.DangerTilt): the mean of weight * value for
+    each metric, an unbiased estimate of the untilted mean, with its variance and confidence interval. 'party lost' is
+    the chance that nobody survives. Survivors are estimated as party_size less the weighted deaths: deaths are rare,
+    while weighted survivors would carry all of the weights' own noise.
+
+    The mean weight should come out near 1, and the effective sample size, (sum of weights)^2 / sum of squared
+    weights, says how many untilted trials the weighted ones are worth; a small one means the tilt is too strong.
+    """
+    metrics = TrialStatistics.metrics + ('party lost',)
+
+    def __init__(self, trail_miles, party_size, targets=None, confidence=0.95, min_trials=100):
+        self.trail_miles = float(trail_miles)
+        self.party_size = float(party_size)
+        self.targets = dict() if targets is None else targets
+        for metric in self.targets:
+            if metric not in self.metrics:
+                raise ValueError('ERROR - unknown metric for early stopping: ' + str(metric))
+
+        self.confidence = confidence
+        self.min_trials = min_trials
+        self.stats = dict([(metric, RunningStats()) for metric in self.metrics])
+        self.weights = RunningStats()
+        self.weight_sum = 0.0
+        self.square_weight_sum = 0.0
+
+
+    def trial_metrics(self, result):
+        survivors = result['survivors']
+        return {'survivors': survivors,
+                'travel time': result['travel time'] / 60.0 / 60.0,
+                'bears per mile': result['bear attacks'] / self.trail_miles,
+                'HARM': harm(self.party_size - survivors, self.trail_miles),
+                'party lost': 1.0 if survivors == 0 else 0.0}
+
+
+    def update(self, result):
+        weight = result['weight']
+        for metric, value in self.trial_metrics(result).iteritems():
+            if metric == 'survivors':
+                self.stats[metric].push(self.party_size - weight * (self.party_size - value))
+            else:
+                self.stats[metric].push(weight * value)
+
+        self.weights.push(weight)
+        self.weight_sum += weight
+        self.square_weight_sum += weight * weight
+
+
+    def trials(self):
+        return self.weights.count
+
+
+    def effective_sample_size(self):
+        return self.weight_sum ** 2 / self.square_weight_sum if self.square_weight_sum > 0 else 0.0
+
+
+    def converged(self):
+        if not self.targets or self.trials() < self.min_trials:
+            return False
+
+        for metric, width in self.targets.iteritems():
+            if 2.0 * self.stats[metric].half_width(self.confidence) > width:
+                return False
+
+        return True
+
+
+    def print_summary(self):
+        print 'importance sampled estimates after', self.trials(), 'trials (' + str(int(100 * self.confidence)) + \
+            '% CI):'
+        for metric in self.metrics:
+            s = self.stats[metric]
+            low, high = s.confidence_interval(self.confidence)
+            print '  %s: mean %.4g [%.4g, %.4g] variance of the estimate %.4g' % (metric, s.mean, low, high,
+                                                                               s.variance() / max(s.count, 1))
+        print '  mean weight %.4g, effective sample size %.1f' % (self.weights.mean, self.effective_sample_size())
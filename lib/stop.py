@@ -1,16 +1,34 @@
-class Stop():
+from terrain import TerrainSection
+
+# every distinct set of actions, shared by all the stops that offer it
+_actions = dict()
+
+# properties of a stop that has none
+NO_PROPERTIES = TerrainSection()
+
+
+def shared_actions(actions):
+    actions = frozenset(actions)
+    return _actions.setdefault(actions, actions)
+
+
+class Stop(object):
     '''
     A Stop exists at each mile marker along the trail. Most of these are a generic Camp, but special stops like rivers
      and towns are also to be found. The party makes a decision at each stop, depending the actions available to it.
      Typically these are to travel on or to rest, but others may be available. Sometimes you will encounter a malady
      or comfort at a stop, such as disease, snake bite, bear attack, food, water, abandoned provisions, etc.
+
+     There is a stop for every mile, so stops have __slots__, and share what they can: their actions (shared_actions,
+     fixed once the stop is built) and their properties (terrain.TerrainSection, read-only).
     '''
+    __slots__ = ('name', 'kind', 'mile_marker', 'actions', 'properties', 'malady', 'comfort')
 
     def __init__(self):
         self.name = None
         self.kind = None
         self.mile_marker = None
         self.actions = set(['travel', 'rest'])
-        self.properties = dict()
+        self.properties = NO_PROPERTIES
         self.malady = None
         self.comfort = None
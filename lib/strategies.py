@@ -0,0 +1,192 @@
+import numpy
+
+# name --> strategy, see register_strategy
+STRATEGIES = dict()
+
+# GreatestNeedTable's tables, built once per process for each grid
+_policy_tables = dict()
+
+
+def register_strategy(strategy_class):
+    """
+    Class decorator: make a Strategy subclass available by its name, to Party.decide and main.py --strategy.
+    """
+    if strategy_class.name in STRATEGIES:
+        raise ValueError('ERROR - a strategy with this name is already registered: ' + str(strategy_class.name))
+    STRATEGIES[strategy_class.name] = strategy_class()
+
+    return strategy_class
+
+
+def get_strategy(name):
+    try:
+        return STRATEGIES[name]
+    except KeyError:
+        raise ValueError('ERROR - requested strategy is not implemented: ' + str(name))
+
+
+class Strategy():
+    """
+    A way of choosing the party's next action. scores() rates every action available at the current stop in one call,
+    so that work shared between actions is done once; decide() takes the best. Strategies hold no per-party state, and
+    one instance is shared by every party.
+
+    Both are given the trail the party is on, so that a strategy can look ahead, e.g. with
+    trail.miles_to_next_stop(party.current_stop.mile_marker, 'town') for the distance to the next chance to resupply.
+    """
+    name = None
+
+    def scores(self, party, trail, actions, hours):
+        """
+        Returns: dict of action --> score, higher is better, for the actions the strategy can rate
+        -------
+        """
+        raise NotImplementedError
+
+
+    def decide(self, party, trail, hours):
+        scores = self.scores(party, trail, party.current_stop.actions, hours)
+
+        # the first best action, in the stop's order of actions
+        max_action, max_score = None, None
+        for action in party.current_stop.actions:
+            score = scores.get(action)
+            if score is not None and (max_score is None or score > max_score):
+                max_action, max_score = action, score
+
+        if max_action is None:
+            raise ValueError('ERROR - No action has a defined utility, connot continue.')
+
+        return max_action
+
+
+
+@register_strategy
+class GreatestNeed(Strategy):
+    """
+    Balance progress against days of food and health left (Party.utility_travel, utility_ford, utility_caulk). The
+    remaining health term is the same for every action, so it is worked out once per decision.
+    """
+    name = 'greatest need'
+
+    # party needs are a balance between continue and survive
+    # party high level needs are: continue and recover/resupply
+    # continue actions: travel/ferry/ford/caulk
+    # recover actions: rest/eat/drink/repair/trade/shop/hunt
+    rated_actions = set(['travel', 'ford', 'caulk'])
+
+    def scores(self, party, trail, actions, hours):
+        rated = actions & self.rated_actions
+        if len(rated) == 1 and 'travel' in rated:
+            # nothing to choose between, so spare the utility
+            return {'travel': 0.0}
+
+        health_days = party.remaining_health(action='travel', parameters={'days': 1}) if rated else None
+
+        scores = dict()
+        for action in rated:
+            if action == 'travel':
+                scores[action] = party.utility_travel(hours, health_days)
+            elif action == 'ford':
+                scores[action] = party.utility_ford(hours, health_days)
+            elif action == 'caulk':
+                scores[action] = party.utility_caulk(hours)
+
+        return scores
+
+
+
+@register_strategy
+class PressOn(Strategy):
+    """
+    A cheap rule-based baseline: always move on, by trail if there is one, else by fording, else by caulking.
+    """
+    name = 'press on'
+
+    preference = ('travel', 'ford', 'caulk')
+
+    def scores(self, party, trail, actions, hours):
+        return dict([(action, -rank) for rank, action in enumerate(self.preference) if action in actions])
+
+
+
+@register_strategy
+class GreatestNeedTable(GreatestNeed):
+    """
+    'greatest need' with the choice between travelling on and fording looked up in a table instead of worked out. Where
+    both are possible their health terms are the same and cancel, so the choice depends only on the party's speed
+    (Party.party_speed, a whole number), its days of food (food carried / daily need) and the river's ford failure rate
+    and food loss fraction. The table holds the choice at each point of a grid over those, resolution apart in days and
+    in rate, and a decision takes the nearest point. States off the grid, and every other decision, are GreatestNeed's.
+
+    With validate, each decision from the table is also worked out exactly; checked and mismatches count how often the
+    two disagree.
+    """
+    name = 'greatest need table'
+
+    table_actions = set(['travel', 'ford'])
+
+    def __init__(self, resolution=0.05, max_food_days=30.0, max_speed=10, validate=False):
+        if resolution <= 0:
+            raise ValueError('ERROR - policy table resolution must be positive: ' + str(resolution))
+
+        self.resolution = resolution
+        self.max_food_days = max_food_days
+        self.max_speed = max_speed
+        self.validate = validate
+        self.checked = 0
+        self.mismatches = 0
+
+
+    def table(self):
+        key = (self.resolution, self.max_food_days, self.max_speed)
+        table = _policy_tables.get(key)
+        if table is None:
+            table = build_policy_table(*key)
+            _policy_tables[key] = table
+
+        return table
+
+
+    def scores(self, party, trail, actions, hours):
+        if actions & self.rated_actions != self.table_actions:
+            return GreatestNeed.scores(self, party, trail, actions, hours)
+
+        speed = party.party_speed(hours)
+        food_days = party.food_total / float(party.food_need_total)
+        day = party.calendar.day(hours)
+        failure_rate = party.current_stop.ford_failure_rate(day)
+        food_loss_fraction = party.current_stop.ford_food_loss_fraction(day)
+        if speed > self.max_speed or food_days > self.max_food_days or failure_rate > 1 or food_loss_fraction > 1:
+            return GreatestNeed.scores(self, party, trail, actions, hours)
+
+        r = self.resolution
+        travel = self.table()[speed, int(food_days / r + 0.5), int(failure_rate / r + 0.5),
+                              int(food_loss_fraction / r + 0.5)]
+
+        if self.validate:
+            exact = GreatestNeed.scores(self, party, trail, actions, hours)
+            self.checked += 1
+            if (exact['travel'] >= exact['ford']) != travel:
+                self.mismatches += 1
+
+        return {'travel': 1.0, 'ford': 0.0} if travel else {'travel': 0.0, 'ford': 1.0}
+
+
+
+def build_policy_table(resolution, max_food_days, max_speed):
+    """
+    Returns: boolean array, True where travelling beats fording, indexed by speed, then food days, ford failure rate and
+    food loss fraction in steps of resolution
+    -------
+    """
+    food_days = numpy.arange(int(round(max_food_days / resolution)) + 1) * resolution
+    rates = numpy.arange(int(round(1.0 / resolution)) + 1) * resolution
+    speed, days, failure_rate, loss = numpy.ix_(numpy.arange(max_speed + 1), food_days, rates, rates)
+
+    # Party.utility_travel and Party.utility_ford, less the health cost they share
+    b = 3.1/2.0
+    travel = speed / 15.0 - b / (0.1 + numpy.maximum(days - 1, 0.0))
+    ford = 1.0 * failure_rate - b / (0.1 + numpy.maximum(days - 1 - loss * days, 0.0))
+
+    return travel >= ford
@@ -0,0 +1,122 @@
+import csv
+import os.path
+from datetime import datetime
+
+from lib.runner import run_trials, imap_tasks, scenario_size
+from lib.stats import TrialStatistics
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M'
+
+# a sweep's results table has one row per cell: the cell's settings, then its results
+CELL_COLUMNS = ['trail file', 'terrain file', 'party file', 'strategy', 'start datetime', 'event driven', 'trials',
+                'seed']
+RESULT_COLUMNS = ['completed trials']
+for _metric in TrialStatistics.metrics:
+    RESULT_COLUMNS += [_metric, _metric + ' low', _metric + ' high', _metric + ' std']
+COLUMNS = CELL_COLUMNS + RESULT_COLUMNS
+
+
+def sweep_cells(start_datetimes, party_files, trails, strategies, trials, seed, event_driven=False):
+    """
+    Every combination of start datetime, party file, (trail file, terrain file) pair and strategy, as a list of cells
+    (dicts keyed by CELL_COLUMNS). Cells on the same trail come together, so a worker process parses each trail once.
+
+    Every cell runs the same trial numbers on the same base seed, so the cells of a sweep see the same random streams.
+    """
+    cells = list()
+    for trail_file, terrain_file in trails:
+        for party_file in party_files:
+            for strategy in strategies:
+                for start_datetime in start_datetimes:
+                    cells.append({'trail file': os.path.abspath(trail_file),
+                                  'terrain file': os.path.abspath(terrain_file),
+                                  'party file': os.path.abspath(party_file),
+                                  'strategy': strategy,
+                                  'start datetime': start_datetime,
+                                  'event driven': event_driven,
+                                  'trials': trials,
+                                  'seed': seed})
+
+    return cells
+
+
+def cell_key(cell):
+    # a cell's settings as they read back from the results table
+    return tuple([format_value(cell[column]) for column in CELL_COLUMNS])
+
+
+def format_value(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    return str(value)
+
+
+def cell_scenario(cell):
+    return {'start datetime': cell['start datetime'],
+            'trail file': cell['trail file'],
+            'terrain file': cell['terrain file'],
+            'party file': cell['party file'],
+            'strategy': cell['strategy'],
+            'event driven': cell['event driven']}
+
+
+def run_cell(cell):
+    """
+    Run every trial of one cell in this process.
+
+    Returns: the cell's row of the results table, a dict keyed by COLUMNS
+    -------
+    """
+    scenario = cell_scenario(cell)
+    trail_miles, party_size = scenario_size(scenario)
+    monitor = TrialStatistics(trail_miles, party_size)
+    run_trials(scenario, cell['trials'], cell['seed'], monitor=monitor)
+
+    row = dict(cell)
+    row['completed trials'] = monitor.trials()
+    for metric in TrialStatistics.metrics:
+        s = monitor.stats[metric]
+        row[metric] = s.mean
+        row[metric + ' low'], row[metric + ' high'] = s.confidence_interval(monitor.confidence)
+        row[metric + ' std'] = s.std()
+
+    return row
+
+
+def read_sweep(file_name):
+    """
+    Returns: the rows of a results table written by run_sweep, as dicts of column --> string; none if there is no file
+    -------
+    """
+    if not os.path.exists(file_name):
+        return list()
+
+    with open(file_name, 'rb') as sweep_file:
+        return list(csv.DictReader(sweep_file))
+
+
+def run_sweep(cells, file_name, workers=1):
+    """
+    Run the cells of a sweep over a pool of worker processes, one cell per task, and append each cell's row to the CSV
+    results table file_name as soon as it is done. Cells already in the table are skipped, so a sweep that was stopped
+    carries on where it left off when run again with the same cells.
+
+    Returns: number of cells run, and number skipped as already done
+    -------
+    """
+    done = set([tuple([row[column] for column in CELL_COLUMNS]) for row in read_sweep(file_name)])
+    remaining = [cell for cell in cells if cell_key(cell) not in done]
+
+    new_file = not os.path.exists(file_name) or os.path.getsize(file_name) == 0
+    with open(file_name, 'ab') as sweep_file:
+        writer = csv.DictWriter(sweep_file, COLUMNS)
+        if new_file:
+            writer.writeheader()
+            sweep_file.flush()
+
+        for row in imap_tasks(run_cell, remaining, workers):
+            writer.writerow(dict([(column, format_value(value)) for column, value in row.iteritems()]))
+            # a row on disk is a cell that is never run again
+            sweep_file.flush()
+
+    return len(remaining), len(cells) - len(remaining)
@@ -0,0 +1,101 @@
+from bisect import bisect_left
+
+
+class TerrainSection(dict):
+    """
+    A read-only dict of a stop's properties. Every camp on a terrain section refers to the section's one
+    TerrainSection instead of holding a copy of it. The properties the party reads on every mile are also attributes,
+    which are quicker to get than keys: dangers (empty if none) and travel_speed_modifier (None if none).
+    """
+    __slots__ = ('dangers', 'travel_speed_modifier')
+
+    def __init__(self, properties=()):
+        dict.__init__(self, properties)
+        self.dangers = dict.get(self, 'dangers', ())
+        self.travel_speed_modifier = dict.get(self, 'travel speed modifier')
+
+
+    def read_only(self, *args, **kwargs):
+        raise TypeError('ERROR - stop properties are shared between stops and cannot be changed')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = read_only
+
+
+    def __reduce__(self):
+        # rebuilt from a plain dict, since the usual way of copying a dict sets its items one by one
+        return (TerrainSection, (dict(self),))
+
+
+
+def terrain_section(properties):
+    # properties as a TerrainSection, sharing it if it already is one
+    return properties if isinstance(properties, TerrainSection) else TerrainSection(properties)
+
+
+
+class TerrainIndex():
+    """
+    Sorted interval index over the sections of a terrain file. Each section covers the closed range of mile markers in
+    its 'trail section'. Neighbouring sections may share an end point, in which case the earlier section owns it.
+    Gaps and overlaps are found once, when the index is built, and reported as warnings.
+    """
+    def __init__(self, terrain_data):
+        self.gaps = list()
+        self.overlaps = list()
+
+        sections = sorted(terrain_data, key=lambda section: section['trail section'][0])
+
+        # keep sections with strictly increasing end points, so a bisect on the ends finds the owner of a mile marker
+        self.starts = list()
+        self.ends = list()
+        self.sections = list()
+        for section in sections:
+            start, end = section['trail section']
+            if start > end:
+                raise ValueError('ERROR - trail section ends before it starts: ' + str(section['trail section']))
+
+            if self.sections:
+                last_end = self.ends[-1]
+                if start < last_end:
+                    self.overlaps.append((self.sections[-1]['trail section'], section['trail section']))
+                    if end <= last_end:
+                        # hidden entirely behind the section before it
+                        continue
+                elif start > last_end + 1:
+                    self.gaps.append((last_end, start))
+
+            self.starts.append(start)
+            self.ends.append(end)
+            self.sections.append(terrain_section(section))
+
+        for gap in self.gaps:
+            print 'WARNING - no terrain between mile markers ' + str(gap[0]) + ' and ' + str(gap[1])
+
+        for first, second in self.overlaps:
+            print 'WARNING - terrain sections overlap: ' + str(first) + ' and ' + str(second)
+
+
+    def lookup(self, mile_marker):
+        i = bisect_left(self.ends, mile_marker)
+        if i < len(self.ends) and self.starts[i] <= mile_marker:
+            return self.sections[i]
+        else:
+            raise ValueError('ERROR - no trail section found at mile marker ' + str(mile_marker))
+
+
+    def runs(self, start, end):
+        """
+        The sections that the mile markers from start up to but not including end look up to, as runs in mile order.
+
+        Returns: iterator of (first mile marker, mile marker after the last, section)
+        -------
+        """
+        mile_marker = start
+        while mile_marker < end:
+            i = bisect_left(self.ends, mile_marker)
+            if i == len(self.ends) or self.starts[i] > mile_marker:
+                raise ValueError('ERROR - no trail section found at mile marker ' + str(mile_marker))
+            run_end = min(end, self.ends[i] + 1)
+            yield mile_marker, run_end, self.sections[i]
+            mile_marker = run_end
+
@@ -1,9 +1,11 @@
-from stop import Stop
+from stop import Stop, shared_actions
+from terrain import terrain_section
 
 class Town(Stop):
     '''
     Town is a special stop along the trail offering rest, repairs, and trade
     '''
+    __slots__ = ()
 
     def __init__(self, name='town', mile_marker=None, add_actions=None, rem_actions=None, properties=None):
         Stop.__init__(self)
@@ -30,6 +32,7 @@ class Town(Stop):
 
         self.actions.update(set(add_actions))
         self.actions.difference_update(set(rem_actions))
+        self.actions = shared_actions(self.actions)
 
-        self.properties.update(properties)
+        self.properties = terrain_section(properties)
 
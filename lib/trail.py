@@ -1,9 +1,192 @@
+import copy
 import json
+import math
+from array import array
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 
+import numpy
+
 from lib.camp  import Camp
 from lib.river import River
 from lib.town  import Town
+from lib.terrain import TerrainIndex
+from lib.util import added_distance
+
+# actions that move a party on - a stop that offers only 'travel' of these can be crossed without a decision
+MOVING_ACTIONS = set(['travel', 'ford', 'caulk'])
+
+# the actions of a camp between the trail's stops, the same for every one
+CAMP_ACTIONS = frozenset(Camp().actions)
+
+
+def compact_table(typecode, values):
+    # a per-mile table as an array.array: 8 bytes a mile, and it indexes to Python numbers nearly as fast as a list
+    table = array(typecode)
+    table.fromstring(numpy.ascontiguousarray(values, dtype=typecode).tostring())
+    return table
+
+
+
+def spread_runs(miles, starts, ends, values, fill):
+    """
+    Returns: numpy array over mile markers 0 to miles - 1, holding values[i] from starts[i] up to but not including
+    ends[i], and fill elsewhere
+    -------
+    """
+    table = numpy.empty(miles, dtype=numpy.array(values + [fill]).dtype)
+    table.fill(fill)
+    lengths = numpy.subtract(ends, starts)
+    if lengths.size:
+        # each run's mile markers, all runs end to end
+        offsets = numpy.repeat(numpy.subtract(starts, numpy.cumsum(lengths) - lengths), lengths)
+        table[offsets + numpy.arange(lengths.sum())] = numpy.repeat(values, lengths)
+    return table
+
+
+
+class LazyPath():
+    """
+    Trail.path: mile marker --> stop. The stops listed in the trail file are built with the trail, but the camps
+    between them are described only by their terrain section, and each is built the first time it is looked up. A
+    party only looks up the miles it stops on, so a long trail costs time and memory for the miles actually visited.
+
+    actions() and properties() describe a mile's stop without building it, and segments() the whole path a run of
+    alike stops at a time, for tables computed over every mile.
+    """
+    def __init__(self, terrain_index):
+        self.terrain_index = terrain_index
+        # mile marker --> stop, for the trail file's stops and the camps built so far
+        self.stops = dict()
+        # mile markers of the trail file's stops, in order
+        self.listed = list()
+        # runs of camps, from camp_starts[i] up to but not including camp_ends[i]
+        self.camp_starts = list()
+        self.camp_ends = list()
+
+
+    def add_stop(self, mile_marker, stop):
+        self.stops[mile_marker] = stop
+        self.listed.append(mile_marker)
+
+
+    def add_camps(self, start, end):
+        if start < end:
+            self.camp_starts.append(start)
+            self.camp_ends.append(end)
+
+
+    def is_camp(self, mile_marker):
+        # whether mile_marker is a camp between the trail file's stops, built or not
+        i = bisect_right(self.camp_starts, mile_marker) - 1
+        return i >= 0 and mile_marker < self.camp_ends[i]
+
+
+    def __getitem__(self, mile_marker):
+        stop = self.stops.get(mile_marker)
+        if stop is None:
+            if not self.is_camp(mile_marker):
+                raise KeyError(mile_marker)
+            stop = Camp(mile_marker=mile_marker, properties=self.terrain_index.lookup(mile_marker))
+            self.stops[mile_marker] = stop
+
+        return stop
+
+
+    def get(self, mile_marker, default=None):
+        return self[mile_marker] if mile_marker in self else default
+
+
+    def __contains__(self, mile_marker):
+        return mile_marker in self.stops or self.is_camp(mile_marker)
+
+
+    def peek(self, mile_marker):
+        # the stop if it has been built, else None
+        return self.stops.get(mile_marker)
+
+
+    def actions(self, mile_marker):
+        stop = self.stops.get(mile_marker)
+        if stop is not None:
+            return stop.actions
+        elif self.is_camp(mile_marker):
+            return CAMP_ACTIONS
+        raise KeyError(mile_marker)
+
+
+    def properties(self, mile_marker):
+        stop = self.stops.get(mile_marker)
+        if stop is not None:
+            return stop.properties
+        elif self.is_camp(mile_marker):
+            return self.terrain_index.lookup(mile_marker)
+        raise KeyError(mile_marker)
+
+
+    def segments(self):
+        """
+        The path in mile order, as runs of mile markers whose stops are described alike. A trail file stop is a run of
+        its own; the camps between two of them are a run for each terrain section they cross, with no stop.
+
+        Returns: iterator of (first mile marker, mile marker after the last, stop or None, properties, actions)
+        -------
+        """
+        runs = [(mm, mm + 1, self.stops[mm]) for mm in self.listed]
+        runs += [(start, end, None) for start, end in zip(self.camp_starts, self.camp_ends)]
+        for start, end, stop in sorted(runs):
+            if stop is not None:
+                yield start, end, stop, stop.properties, stop.actions
+            else:
+                for run_start, run_end, section in self.terrain_index.runs(start, end):
+                    yield run_start, run_end, None, section, CAMP_ACTIONS
+
+
+
+class PathView():
+    """
+    A trial's view of a shared LazyPath, with some of its stops replaced by the trial's own (rivers, see TrailView).
+    Camps built through a view are built in the shared path, for every later trial to use.
+    """
+    def __init__(self, path, own_stops):
+        self.path = path
+        self.stops = path.stops
+        self.own_stops = own_stops
+
+
+    def __getitem__(self, mile_marker):
+        # looked up on every mile, so built stops are found without a call into the shared path
+        stop = self.own_stops.get(mile_marker)
+        if stop is None:
+            stop = self.stops.get(mile_marker)
+            if stop is None:
+                stop = self.path[mile_marker]
+        return stop
+
+
+    def get(self, mile_marker, default=None):
+        return self[mile_marker] if mile_marker in self else default
+
+
+    def __contains__(self, mile_marker):
+        return mile_marker in self.own_stops or mile_marker in self.path
+
+
+    def peek(self, mile_marker):
+        stop = self.own_stops.get(mile_marker)
+        return stop if stop is not None else self.path.peek(mile_marker)
+
+
+    def actions(self, mile_marker):
+        stop = self.own_stops.get(mile_marker)
+        return stop.actions if stop is not None else self.path.actions(mile_marker)
+
+
+    def properties(self, mile_marker):
+        stop = self.own_stops.get(mile_marker)
+        return stop.properties if stop is not None else self.path.properties(mile_marker)
+
+
 
 class Trail():
     """
@@ -22,15 +205,19 @@ class Trail():
         else:
             raise ValueError('ERROR - terrain file required')
 
+        self.terrain_index = TerrainIndex(self.terrain_data)
+
         self.initialize_path()
+        self.initialize_cost_table()
+        self.initialize_leap_tables()
 
-        for stop in self.path:
-            if isinstance(stop, River):
-                stop.initialize_river_state(date_and_time.year)
+        self.river_mile_markers = sorted([mm for mm, stop in self.path.stops.iteritems() if isinstance(stop, River)])
+        for mile_marker in self.river_mile_markers:
+            self.path[mile_marker].initialize_river_state(date_and_time.year)
 
 
     def initialize_path(self):
-        self.path = dict()
+        self.path = LazyPath(self.terrain_index)
         mile_marker = 0
 
         for i, trail_stop in enumerate(self.trail_data):
@@ -49,10 +236,8 @@ class Trail():
                 if next_mile_marker <= mile_marker:
                     raise ValueError('ERROR - List of trail stops is out of order: ' + str(i) + ' ' + str(trail_stop))
 
-            # construct the path between trail_stops
-            for mm in range(mile_marker + 1, next_mile_marker):
-                # camp stops between trail stops
-                self.path[mm] = Camp(mile_marker=mm, properties=self.get_terrain(mm))
+            # camp stops between trail stops, built when the party gets there
+            self.path.add_camps(mile_marker + 1, next_mile_marker)
 
             # trail stop at next_mile_marker
             add_actions = trail_stop.get('add actions')
@@ -60,51 +245,147 @@ class Trail():
             properties  = trail_stop.get('properties')
 
             if trail_stop['kind'] == 'camp':
-                self.path[next_mile_marker] = Camp(name=trail_stop.get('name', 'camp'), mile_marker=next_mile_marker, add_actions=add_actions, rem_actions=rem_actions, properties=properties)
-                self.path[next_mile_marker].set_terrain(self.get_terrain(mile_marker))
+                camp = Camp(name=trail_stop.get('name', 'camp'), mile_marker=next_mile_marker, add_actions=add_actions, rem_actions=rem_actions, properties=properties)
+                camp.set_terrain(self.get_terrain(mile_marker))
+                self.path.add_stop(next_mile_marker, camp)
             elif trail_stop['kind'] == 'town':
-                self.path[next_mile_marker] = Town(name=trail_stop.get('name', 'town'), mile_marker=next_mile_marker, add_actions=add_actions, rem_actions=rem_actions, properties=properties)
+                self.path.add_stop(next_mile_marker, Town(name=trail_stop.get('name', 'town'), mile_marker=next_mile_marker, add_actions=add_actions, rem_actions=rem_actions, properties=properties))
             elif trail_stop['kind'] == 'river':
-                self.path[next_mile_marker] = River(name=trail_stop.get('name', 'river'), mile_marker=next_mile_marker, add_actions=add_actions, rem_actions=rem_actions, properties=properties)
+                self.path.add_stop(next_mile_marker, River(name=trail_stop.get('name', 'river'), mile_marker=next_mile_marker, add_actions=add_actions, rem_actions=rem_actions, properties=properties))
             else:
                 ValueError('ERROR - Trail stop kind ' + str(trail_stop['kind']) + ' not implemented.')
 
             mile_marker = next_mile_marker
 
+        self.initialize_stop_tables()
+
 
     def get_terrain(self, mile_marker):
-        section_found = False
-        for section in self.terrain_data:
-            if section['trail section'][0] <= mile_marker <= section['trail section'][1]:
-                section_found = True
-                break
-
-        if section_found:
-            return section
-        else:
-            raise ValueError('ERROR - no trail section found at mile marker ' + str(mile_marker))
+        return self.terrain_index.lookup(mile_marker)
+
 
+    def initialize_stop_tables(self):
+        """
+        The mile markers of the stops of each kind ('major' is any river or town), in order, for next_stop and last_stop
+        to bisect. A stop counts as its own next and last stop.
+        """
+        kinds = {'major': (River, Town), 'river': River, 'town': Town}
+        listed = self.path.listed
 
-    def next_major_stop(self, current_mile_marker):
-        found_next_major_stop = False
-        while(not found_next_major_stop):
-            if isinstance(self.path[current_mile_marker], (River, Town)):
-                found_next_major_stop = True
-            else:
-                current_mile_marker += 1
+        self.first_mile_marker = min(listed[:1] + self.path.camp_starts[:1])
+        self.last_mile_marker = max(listed[-1:] + [end - 1 for end in self.path.camp_ends[-1:]])
 
-        return self.path[current_mile_marker]
+        self.stop_mile_markers = dict()
+        for kind, classes in kinds.iteritems():
+            self.stop_mile_markers[kind] = [mm for mm in listed if isinstance(self.path.stops[mm], classes)]
 
 
-    def last_major_stop(self, current_mile_marker):
-        found_last_major_stop = False
-        while (not found_last_major_stop):
-            if isinstance(self.path[current_mile_marker], (River, Town)):
-                found_last_major_stop = True
-            else:
-                current_mile_marker -= 1
+    def initialize_cost_table(self):
+        """
+        mile_cost[mm] is the time in hours that mile mm, from stop mm to stop mm + 1 on stop mm's terrain, takes at a
+        speed of one mile per hour: a mile longer for every 1000 feet of climb (util.added_distance), slowed by the
+        surface. Party.party_travel_time divides it by the party's speed. NaN where there is no stop.
+
+        Worked out once for each run of camps on a terrain section (LazyPath.segments), not once for each mile.
+        """
+        starts, ends, costs = list(), list(), list()
+        for start, end, stop, properties, actions in self.path.segments():
+            distance = 1.0 + added_distance(properties.get('elevation gain per mile'))
+            starts.append(start)
+            ends.append(end)
+            costs.append(distance / properties.get('surface speed modifier', 1.0))
+
+        self.mile_cost = compact_table('d', spread_runs(self.last_mile_marker + 1, starts, ends, costs, float('nan')))
+
+
+    def initialize_leap_tables(self):
+        """
+        Precompute what the event-driven clock needs to cross a run of quiet miles in one step. Mile mm runs from stop mm
+        to stop mm + 1 on stop mm's terrain. For every mile marker mm:
+
+        quiet_until[mm]: the first stop at or after mm where the party has to step - a major stop, one where it has a
+        choice to make or a danger is certain, or the end of the trail
+        cost_sum[mm], cost_square_sum[mm]: sums over the miles before mm of the hours a mile takes at unit speed, and of
+        their squares
+        hazard_sum[mm]: -log of the chance that no danger strikes on any mile before mm
+
+        Each run of alike stops (LazyPath.segments) is looked at once, and the tables are kept as compact arrays.
+        """
+        miles = self.last_mile_marker + 1
+        # the runs of miles that can be leapt, and what each of their miles costs and risks
+        starts, ends, costs, hazards = list(), list(), list(), list()
+        travel_only = set(['travel'])
+        for start, end, stop, properties, actions in self.path.segments():
+            if isinstance(stop, (River, Town)) or actions & MOVING_ACTIONS != travel_only:
+                continue
+
+            quiet = 1.0
+            for danger in properties.get('dangers', list()):
+                quiet *= 1.0 - danger['probability']
+            elevation_gain = properties.get('elevation gain per mile')
+            if quiet <= 0.0 or elevation_gain is None:
+                continue
+
+            # the party always steps at the end of the trail
+            end = min(end, miles - 1)
+            if start < end:
+                starts.append(start)
+                ends.append(end)
+                costs.append(self.mile_cost[start])
+                hazards.append(-math.log(quiet))
 
-        return self.path[current_mile_marker]
+        leapable = spread_runs(miles, starts, ends, [True] * len(starts), False)
+        cost = spread_runs(miles, starts, ends, costs, 0.0)
+        hazard = spread_runs(miles, starts, ends, hazards, 0.0)
+
+        stops = numpy.flatnonzero(~leapable)
+        self.quiet_until = compact_table('l', stops[numpy.searchsorted(stops, numpy.arange(miles))])
+
+        # the sums run in mile order, as adding them up one mile at a time would
+        self.cost_sum = compact_table('d', numpy.concatenate(([0.0], numpy.cumsum(cost))))
+        self.cost_square_sum = compact_table('d', numpy.concatenate(([0.0], numpy.cumsum(cost * cost))))
+        self.hazard_sum = compact_table('d', numpy.concatenate(([0.0], numpy.cumsum(hazard))))
+
+
+    def next_stop_mile_marker(self, current_mile_marker, kind='major'):
+        mile_markers = self.stop_mile_markers[kind]
+        i = bisect_left(mile_markers, current_mile_marker)
+        return mile_markers[i] if i < len(mile_markers) else None
+
+
+    def last_stop_mile_marker(self, current_mile_marker, kind='major'):
+        mile_markers = self.stop_mile_markers[kind]
+        i = bisect_right(mile_markers, current_mile_marker) - 1
+        return mile_markers[i] if i >= 0 else None
+
+
+    def next_stop(self, current_mile_marker, kind='major'):
+        mm = self.next_stop_mile_marker(current_mile_marker, kind)
+        return None if mm is None else self.path[mm]
+
+
+    def last_stop(self, current_mile_marker, kind='major'):
+        mm = self.last_stop_mile_marker(current_mile_marker, kind)
+        return None if mm is None else self.path[mm]
+
+
+    def miles_to_next_stop(self, current_mile_marker, kind='major'):
+        # e.g. miles_to_next_stop(mm, 'town') is the distance to the next chance to resupply
+        mm = self.next_stop_mile_marker(current_mile_marker, kind)
+        return None if mm is None else mm - current_mile_marker
+
+
+    def miles_since_last_stop(self, current_mile_marker, kind='major'):
+        mm = self.last_stop_mile_marker(current_mile_marker, kind)
+        return None if mm is None else current_mile_marker - mm
+
+
+    def next_major_stop(self, current_mile_marker):
+        return self.next_stop(current_mile_marker, 'major')
+
+
+    def last_major_stop(self, current_mile_marker):
+        return self.last_stop(current_mile_marker, 'major')
 
 
     """
@@ -128,11 +409,46 @@ class Trail():
 
 
     def start_of_trail(self):
-        return self.path[min(self.path.keys())]
+        return self.path[self.first_mile_marker]
 
 
     def end_of_trail(self):
-        return self.path[max(self.path.keys())]
+        return self.path[self.last_mile_marker]
+
 
+    def trial_view(self, date_and_time):
+        return TrailView(self, date_and_time)
 
 
+
+class TrailView(Trail):
+    """
+    A cheap per-trial view of a Trail that is built once and shared as a template. The camps and towns are the
+    template's own objects, built lazily in the template's path (see PathView); only the rivers are copied, each with a
+    fresh random history for this trial. Nothing in the view may modify a shared stop.
+    """
+    def __init__(self, template, date_and_time):
+        self.template = template
+        self.trail_data = template.trail_data
+        self.terrain_data = template.terrain_data
+        self.terrain_index = template.terrain_index
+        self.river_mile_markers = template.river_mile_markers
+        self.first_mile_marker = template.first_mile_marker
+        self.last_mile_marker = template.last_mile_marker
+        self.stop_mile_markers = template.stop_mile_markers
+        self.mile_cost = template.mile_cost
+        self.quiet_until = template.quiet_until
+        self.cost_sum = template.cost_sum
+        self.cost_square_sum = template.cost_square_sum
+        self.hazard_sum = template.hazard_sum
+
+        rivers = dict()
+        for mile_marker in self.river_mile_markers:
+            river = copy.copy(template.path[mile_marker])
+            river.initialize_river_state(date_and_time.year)
+            rivers[mile_marker] = river
+        self.path = PathView(template.path, rivers)
+
+
+    def trial_view(self, date_and_time):
+        return self.template.trial_view(date_and_time)
@@ -1,5 +1,6 @@
 from random import sample
 from datetime import datetime, timedelta
+from math import floor
 from numpy import power
 from numpy.random import randint, gamma
 
@@ -26,45 +27,140 @@ def date_to_season(date):
     return season
 
 
-def random_date_in_season(year, season):
+def season_ranges(year, season):
+    """
+    Returns: list of (first day, day after the last) datetimes that make up season in year; 'winter' has two, at either
+    end of the year
+    -------
+    """
     vernal_equinox = datetime(year, 3, 21)
     summer_solstice = datetime(year, 6, 21)
     autumnal_equinox = datetime(year, 9, 21)
     winter_solstice = datetime(year, 12, 21)
 
     if season == 'spring':
-        rd = random_date(vernal_equinox, summer_solstice)
+        ranges = [(vernal_equinox, summer_solstice)]
     elif season == 'summer':
-        rd = random_date(summer_solstice, autumnal_equinox)
+        ranges = [(summer_solstice, autumnal_equinox)]
     elif season == 'fall':
-        rd = random_date(autumnal_equinox, winter_solstice)
+        ranges = [(autumnal_equinox, winter_solstice)]
     elif season == 'winter 1':
-        rd = random_date(datetime(year, 1, 1), vernal_equinox)
+        ranges = [(datetime(year, 1, 1), vernal_equinox)]
     elif season == 'winter 2':
-        rd = random_date(winter_solstice, datetime(year + 1, 1, 1))
+        ranges = [(winter_solstice, datetime(year + 1, 1, 1))]
     elif season == 'winter':
-        rd1 = random_date(datetime(year, 1, 1), vernal_equinox)
-        rd2 = random_date(winter_solstice, datetime(year + 1, 1, 1))
-        rd = sample((rd1, rd2), 1)[0]
+        ranges = [(datetime(year, 1, 1), vernal_equinox), (winter_solstice, datetime(year + 1, 1, 1))]
     else:
         raise ValueError('ERROR - unrecognized season: ' + str(season))
 
+    return ranges
+
+
+def random_date_in_season(year, season, stream=None):
+    # draws from stream (an rng.RandomStream) if given, else from numpy.random
+    ranges = season_ranges(year, season)
+    if len(ranges) == 1:
+        rd = random_date(ranges[0][0], ranges[0][1], stream)
+    else:
+        rd1 = random_date(ranges[0][0], ranges[0][1], stream)
+        rd2 = random_date(ranges[1][0], ranges[1][1], stream)
+        rd = sample((rd1, rd2), 1)[0] if stream is None else stream.choice((rd1, rd2))
+
     return rd
 
 
-def random_date(min_date, max_date):
+def season_dates(year, season):
+    """
+    Returns: every day of season in year, in order, as datetimes at midnight - the days random_date_in_season draws from
+    -------
+    """
+    dates = list()
+    for first, end in season_ranges(year, season):
+        dates.extend([first + timedelta(days=offset) for offset in range((end - first).days)])
+
+    return dates
+
+
+def random_date(min_date, max_date, stream=None):
     days_between = (max_date - min_date).days
-    offset = randint(0, days_between)
+    offset = randint(0, days_between) if stream is None else stream.randint(0, days_between)
     rd = min_date + timedelta(days=offset)
 
     return rd
 
 
-def sample_gamma(mean, std, size=None):
+def added_distance(elevation_gain):
+    # rule of thumb: add a mile for every 1000 feet elevation gain per mile
+    return -0.2 if elevation_gain < -100 else (elevation_gain / 1000.0)
+
 
+def gamma_parameters(mean, std):
+    # numpy.random.gamma has a shape (k), scale (theta) parameterization
     var = power(std, 2)
 
     k = power(mean, 2) / var
     theta = var / mean
 
+    return k, theta
+
+
+def sample_gamma(mean, std, size=None, stream=None):
+    # a single variate comes from stream (an rng.RandomStream) if given
+    k, theta = gamma_parameters(mean, std)
+
+    if stream is not None and size is None:
+        return stream.gamma(k, theta)
+
     return gamma(k, theta, size)
+
+
+def round_robin_add(count, amount):
+    """
+    Shares of amount handed out a pound at a time, round robin, to count members. A fractional last pound goes to the
+    next member in turn.
+    """
+    rounds = floor(amount / float(count))
+    left = amount - rounds * count
+
+    shares = list()
+    for i in range(count):
+        extra = min(1.0, left)
+        left -= extra
+        shares.append(rounds + extra)
+
+    return shares
+
+
+def round_robin_take(inventory, amount):
+    """
+    How much each member gives up when amount is taken out a pound at a time, round robin in member order, never taking
+    a member below zero. A fractional last pound comes from the next member in turn, and no more than the total
+    inventory is ever taken.
+    """
+    amount = min(amount, sum(inventory))
+
+    # whole rounds: the largest integer r with sum(min(inventory, r)) <= amount
+    levels = sorted(inventory)
+    below = 0
+    rounds = None
+    for j, level in enumerate(levels):
+        r = floor((amount - below) / float(len(levels) - j))
+        if r < level:
+            rounds = r
+            break
+        below += level
+
+    if rounds is None:
+        # everything goes
+        return list(inventory)
+
+    taken = [min(food, rounds) for food in inventory]
+
+    # the rest comes one pound (or what is left of one) per member, in order, in the next round
+    left = amount - sum(taken)
+    for i, food in enumerate(inventory):
+        extra = min(min(food, rounds + 1) - taken[i], left)
+        left -= extra
+        taken[i] += extra
+
+    return taken
\ No newline at end of file
@@ -1,31 +1,90 @@
-import datetime
-import math
+from timeit import default_timer
+
+from clock import Calendar
 
 class World():
     """
-    The state of the world consists of a party, the trail, and the time (datetime). Each turn we update the state of the
-    world.
+    The state of the world consists of a party, the trail, and the time: hours since date_and_time, the start. Each turn
+    we update the state of the world. current_datetime() gives the time as a datetime, for output.
+
+    Pass a profiling.Profiler to time each update by phase, action and stop kind. With event_driven, an update crosses
+    a whole run of quiet miles at once when it can (Party.leap), and steps mile by mile only at major stops, choices
+    and events.
     """
-    def __init__(self, date_and_time, party=None, trail=None):
+    def __init__(self, date_and_time, party=None, trail=None, profiler=None, event_driven=False):
         self.party = party
         self.trail = trail
-        self.date_and_time = date_and_time
+        self.calendar = Calendar(date_and_time)
+        self.hours = 0.0
         self.event_counter = dict()
+        self.event_driven = event_driven
+
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.instrument(self)
 
     def update(self, strategy):
+        if self.profiler is not None:
+            return self.profiled_update(strategy)
+
+        if self.event_driven and self.leap():
+            return
+
         # decide what action to take
-        self.party.action = self.party.decide(strategy, self.date_and_time)
+        self.party.action = self.party.decide(strategy, self.trail, self.hours)
         # print self.party.action
 
         # update state based on action
-        time_elapsed_in_hours, events = self.party.update(self.trail, self.date_and_time)
+        time_elapsed_in_hours, events = self.party.update(self.trail, self.hours)
+
+        self.count_events(events)
+        self.advance_clock(time_elapsed_in_hours)
+
+    def profiled_update(self, strategy):
+        # the same steps as update, timed
+        record = self.profiler.record
+        stop_kind = self.party.current_stop.__class__.__name__.lower()
 
+        start = default_timer()
+        if self.event_driven and self.leap():
+            finished = default_timer()
+            record('phase', 'leap', finished - start)
+            record('stop kind', stop_kind, finished - start)
+            return
+
+        self.party.action = self.party.decide(strategy, self.trail, self.hours)
+        decided = default_timer()
+        time_elapsed_in_hours, events = self.party.update(self.trail, self.hours)
+        updated = default_timer()
+        self.count_events(events)
+        self.advance_clock(time_elapsed_in_hours)
+        finished = default_timer()
+
+        record('phase', 'decide', decided - start)
+        record('phase', 'party update', updated - decided)
+        record('phase', 'bookkeeping', finished - updated)
+        record('action', self.party.action, updated - decided)
+        record('stop kind', stop_kind, finished - start)
+
+    def leap(self):
+        # cross the quiet miles ahead in one update, if there are any
+        leap = self.party.leap(self.trail)
+        if leap is None:
+            return False
+
+        time_elapsed_in_hours, events, miles = leap
+        self.count_events(events, miles)
+        self.advance_clock(time_elapsed_in_hours)
+        return True
+
+    def count_events(self, events, times=1):
         for event, value in events.iteritems():
             self.event_counter.setdefault(event, dict())
             self.event_counter[event].setdefault(value, 0)
-            self.event_counter[event][value] += 1
+            self.event_counter[event][value] += times
+
+    def advance_clock(self, time_elapsed_in_hours):
+        self.hours += time_elapsed_in_hours
 
-        minutes_elapsed, hours_elapsed = math.modf(time_elapsed_in_hours)
-        hours_elapsed = int(hours_elapsed)
-        minutes_elapsed = int(round(60 * minutes_elapsed))
-        self.date_and_time += datetime.timedelta(hours=hours_elapsed, minutes=minutes_elapsed)
\ No newline at end of file
+    def current_datetime(self):
+        return self.calendar.datetime(self.hours)
@@ -1,16 +1,34 @@
 import sys
+import json
 import os.path
 import argparse
 import datetime
-from lib.trail import Trail
-from lib.party import Party
-from lib.world import World
-
-from numpy import mean
+from lib.runner import run_trials, run_batch_trials, run_paired_trials, new_seed
+from lib.results import ResultsWriter, summarize_results
+from lib.stats import TrialStatistics, PairedStatistics, WeightedStatistics, powells
+from lib.profiling import Profiler
+from lib.importance import DangerTilt
+from lib.strategies import STRATEGIES, GreatestNeedTable
+from lib.batch import BATCH_STRATEGIES
+
+# Powell metrics for the Belly River loop, as main.py has always printed them
+TRAIL_MILES = 25.67
+PARTY_SIZE = 4.0
+
+# every metric some mode can stop on; statistics_class(args).metrics are the ones the chosen mode keeps
+CI_METRICS = list()
+for _statistics in (TrialStatistics, PairedStatistics, WeightedStatistics):
+    CI_METRICS += [metric for metric in _statistics.metrics if metric not in CI_METRICS]
 
 def main(args):
-    trials = 1000
-    strategy = 'greatest need'
+    trials = args.trials
+    strategy = args.strategy
+    workers = args.workers
+    if strategy == 'greatest need table':
+        strategy = GreatestNeedTable(args.policy_resolution, validate=args.validate_policy)
+        if args.validate_policy and workers > 1:
+            print 'WARNING - --validate-policy counts decisions in this process, so runs with one worker'
+            workers = 1
     start_datetime = datetime.datetime.strptime(args.start_date_time, '%Y-%m-%d %H:%M')
 
     data_path = os.path.abspath('data/')
@@ -18,52 +36,192 @@ def main(args):
     terrain_file_name = os.path.join(data_path, 'belly_river_terrain.json')
     party_file_name = os.path.join(data_path, 'belly_river_party.json')
 
-    stats = {'survivors': list(),
-             'travel time': list(),
-             'bear attacks': list()}
-
-    for t in range(trials):
-
-        trail = Trail(start_datetime, trail_file_name, terrain_file_name)
-        party = Party(start_datetime, party_file_name, trail)
-        world = World(start_datetime, party, trail)
-
-        # simulate until destination or death
-        continue_trail = True
-
-        while continue_trail:
-            world.update(strategy)
-
-            if world.party.condition in ('arrived', 'dead'):
-                # update Powell metrics
-                continue_trail = False
-
-            #print world.date_and_time, world.party.current_stop.mile_marker, world.party.current_stop.name
-            #print world.party.condition, world.party.number_alive()
-            #world.party.print_party_status()
-            #print
-        stats['travel time'].append((world.date_and_time - start_datetime).total_seconds())
-        stats['survivors'].append(world.party.number_alive())
-        stats['bear attacks'].append(world.event_counter['bear attack'].get(True, 0))
-
-    #print 'Total trail time:', world.date_and_time - start_datetime
-
-    print 'number of trips:', len(stats['survivors'])
-    print 'number of bear attacks', sum(stats['bear attacks'])
-    print 'mean survivors:', mean(stats['survivors'])
-    print 'mean travel time (h):', mean(stats['travel time'])/60.0/60.0
+    scenario = {'start datetime': start_datetime,
+                'trail file': trail_file_name,
+                'terrain file': terrain_file_name,
+                'party file': party_file_name,
+                'strategy': strategy,
+                'event driven': args.event_driven}
+    if args.compiled_trail is not None:
+        scenario['compiled trail'] = os.path.abspath(args.compiled_trail)
+
+    seed = args.seed if args.seed is not None else new_seed()
+    print 'seed:', seed
+
+    statistics = statistics_class(args)
+    if statistics is PairedStatistics:
+        return compare(args, scenario, trials, seed, workers)
+    if statistics is WeightedStatistics:
+        return importance_sample(args, scenario, trials, seed, workers)
+
+    # each trial runs on its own (seed, trial) random stream, so results don't depend on the number of workers
+    if args.results is not None:
+        # stream every trial to disk, then summarize from the file
+        with open(party_file_name, 'r') as party_file:
+            members = len(json.load(party_file)['members'])
+        writer = ResultsWriter(args.results, members)
+    else:
+        writer = None
+
+    # keep running statistics as trials complete, and stop early once the target CI width is reached
+    targets = {args.ci_metric: args.ci_width} if args.ci_width is not None else None
+    monitor = TrialStatistics(TRAIL_MILES, PARTY_SIZE, targets, confidence=args.confidence, min_trials=args.min_trials)
+
+    profiler = Profiler() if args.profile else None
+
+    if args.engine == 'batch':
+        if profiler is not None:
+            print 'WARNING - --profile instruments World.update, which the batch engine does not use'
+            profiler = None
+        if args.event_driven:
+            print 'WARNING - --event-driven applies to the scalar engine; the batch engine steps every mile'
+        stats = run_batch_trials(scenario, trials, seed, workers=workers, writer=writer, monitor=monitor)
+    else:
+        stats = run_trials(scenario, trials, seed, workers=workers, writer=writer, monitor=monitor,
+                           profiler=profiler)
+
+    if writer is not None:
+        totals = summarize_results(args.results)
+    else:
+        totals = {'trials': len(stats['survivors']),
+                  'survivors': sum(stats['survivors']),
+                  'travel time': sum(stats['travel time']),
+                  'bear attacks': sum(stats['bear attacks'])}
+
+    print_summary(totals)
+    monitor.print_summary()
+    if monitor.converged():
+        print 'stopped early: the', args.ci_metric, 'CI is narrower than', args.ci_width
+    if profiler is not None:
+        profiler.print_summary()
+    if args.validate_policy and isinstance(strategy, GreatestNeedTable):
+        print 'policy table agreement:', strategy.checked - strategy.mismatches, 'of', strategy.checked, \
+            'table decisions match the exact utilities'
+
+
+def statistics_class(args):
+    # the statistics a run keeps: paired when comparing scenarios, weighted when importance sampling
+    if args.compare_strategy or args.compare_party_file:
+        return PairedStatistics
+    if args.tilt_dangers != 1.0 or args.tilt_severity != 1.0:
+        return WeightedStatistics
+    return TrialStatistics
+
+
+def compare(args, scenario, trials, seed, workers):
+    # run the variants on common random numbers and report their differences from the scenario as given
+    if args.engine == 'batch' or args.results is not None or args.profile:
+        print 'WARNING - comparisons run on the scalar engine, without --results or --profile'
+
+    variants, labels = [scenario], [scenario_label(scenario)]
+    for strategy in args.compare_strategy or list():
+        variants.append(dict(scenario, strategy=strategy))
+        labels.append(scenario_label(variants[-1]))
+    for party_file_name in args.compare_party_file or list():
+        variants.append(dict(scenario, **{'party file': os.path.abspath(party_file_name)}))
+        labels.append(scenario_label(variants[-1]))
+
+    targets = {args.ci_metric: args.ci_width} if args.ci_width is not None else None
+    monitor = PairedStatistics(labels, targets, confidence=args.confidence, min_trials=args.min_trials)
+    stats = run_paired_trials(variants, trials, seed, workers=workers, monitor=monitor)
+
+    for label, variant_stats in zip(labels, stats):
+        print label + ':'
+        print_summary({'trials': len(variant_stats['survivors']),
+                       'survivors': sum(variant_stats['survivors']),
+                       'travel time': sum(variant_stats['travel time']),
+                       'bear attacks': sum(variant_stats['bear attacks'])})
+    monitor.print_summary()
+    if monitor.converged():
+        print 'stopped early: every', args.ci_metric, 'difference CI is narrower than', args.ci_width
+
+
+def importance_sample(args, scenario, trials, seed, workers):
+    # run with tilted dangers and report weighted, unbiased estimates
+    if args.engine == 'batch' or args.results is not None or args.profile:
+        print 'WARNING - importance sampling runs on the scalar engine, without --results or --profile'
+    if args.event_driven:
+        print 'WARNING - importance sampling steps every mile; --event-driven has no effect'
+
+    scenario = dict(scenario, tilt=DangerTilt(args.tilt_dangers, args.tilt_severity))
+    targets = {args.ci_metric: args.ci_width} if args.ci_width is not None else None
+    monitor = WeightedStatistics(TRAIL_MILES, PARTY_SIZE, targets, confidence=args.confidence, min_trials=args.min_trials)
+    run_trials(scenario, trials, seed, workers=workers, monitor=monitor)
+
+    monitor.print_summary()
+    if monitor.converged():
+        print 'stopped early: the', args.ci_metric, 'CI is narrower than', args.ci_width
+
+
+def scenario_label(scenario):
+    return getattr(scenario['strategy'], 'name', scenario['strategy']) + ', ' + os.path.basename(scenario['party file'])
+
+
+def print_summary(totals):
+    trials = totals['trials']
+
+    print 'number of trips:', trials
+    print 'number of bear attacks', totals['bear attacks']
+    print 'mean survivors:', totals['survivors'] / float(trials)
+    print 'mean travel time (h):', totals['travel time'] / float(trials) / 60.0 / 60.0
+
+    for cause, deaths in sorted(totals.get('deaths', dict()).iteritems()):
+        print 'deaths from ' + cause + ':', deaths
 
     # present Powell metrics
-    bears_per_mile = sum(stats['bear attacks']) / 25.67 / trials
-    mortality = (4.0*trials - sum(stats['survivors'])) / trials
-    powells = 1.25 * (25.67 + 4495 / 1000) * (mortality * 2) * 1000.0
-    HARM = powells / 25.67
+    bears_per_mile = totals['bear attacks'] / TRAIL_MILES / trials
+    mortality = (PARTY_SIZE*trials - totals['survivors']) / trials
+    HARM = powells(mortality, TRAIL_MILES) / TRAIL_MILES
 
-    print bears_per_mile, powells, HARM
+    print bears_per_mile, powells(mortality, TRAIL_MILES), HARM
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--start-date-time", help="party start date YYYY-MM-DD hh:mm")
+    parser.add_argument("--trials", type=int, default=1000, help="number of trials to simulate (at most, with --ci-width)")
+    parser.add_argument("--ci-width", type=float, default=None,
+                        help="stop once the confidence interval of --ci-metric is narrower than this")
+    parser.add_argument("--ci-metric", choices=CI_METRICS, default='survivors',
+                        help="metric whose confidence interval decides when to stop (which ones depends on the mode)")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level of the intervals")
+    parser.add_argument("--min-trials", type=int, default=100, help="never stop early before this many trials")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default='greatest need',
+                        help="how the party decides what to do at each stop")
+    parser.add_argument("--policy-resolution", type=float, default=0.05,
+                        help="grid step of the 'greatest need table' strategy, in days of food and in rate")
+    parser.add_argument("--validate-policy", action='store_true',
+                        help="check every 'greatest need table' decision against the exact utilities")
+    parser.add_argument("--compare-strategy", action='append', choices=sorted(STRATEGIES),
+                        help="also run this strategy on the same random numbers and report the differences (repeatable)")
+    parser.add_argument("--compare-party-file", action='append',
+                        help="also run this party on the same random numbers and report the differences (repeatable)")
+    parser.add_argument("--tilt-dangers", type=float, default=1.0,
+                        help="importance sampling: make dangers strike this many times as often, and weight the trials")
+    parser.add_argument("--tilt-severity", type=float, default=1.0,
+                        help="importance sampling: scale the mean severity of dangers by this, and weight the trials")
+    parser.add_argument("--compiled-trail", default=None,
+                        help="load the trail from this artifact, made by compile_trail.py, instead of the JSON files")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--engine", choices=['scalar', 'batch'], default='scalar',
+                        help="simulate one party at a time, or many in lockstep with NumPy")
+    parser.add_argument("--event-driven", action='store_true',
+                        help="cross runs of quiet miles in one step instead of one mile at a time (scalar engine)")
+    parser.add_argument("--results", default=None,
+                        help="stream each trial's outcome to this file and summarize from it")
+    parser.add_argument("--profile", action='store_true',
+                        help="time World.update by phase, action and stop kind, and print a breakdown")
+    parser.add_argument("--seed", type=int, default=None, help="base random seed, for reproducible runs")
     args = parser.parse_args()
+    for option, value in (('--trials', args.trials), ('--workers', args.workers)):
+        if value < 1:
+            parser.error("argument " + option + ": must be at least 1, not " + str(value))
+    metrics = statistics_class(args).metrics
+    if args.ci_metric not in metrics:
+        parser.error("argument --ci-metric: " + repr(args.ci_metric) + " is not kept in this mode (choose from " +
+                     ", ".join([repr(metric) for metric in metrics]) + ")")
+    # comparisons and importance sampling run on the scalar engine whatever --engine says
+    if args.engine == 'batch' and statistics_class(args) is TrialStatistics and args.strategy not in BATCH_STRATEGIES:
+        parser.error("argument --strategy: " + repr(args.strategy) + " is not implemented in the batch engine " +
+                     "(choose from " + ", ".join([repr(strategy) for strategy in BATCH_STRATEGIES]) + ")")
     main(args)
\ No newline at end of file
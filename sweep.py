@@ -0,0 +1,65 @@
+import os.path
+import argparse
+import datetime
+from lib.runner import new_seed
+from lib.strategies import STRATEGIES
+from lib.sweep import sweep_cells, run_sweep, read_sweep, DATETIME_FORMAT
+from lib.util import season_dates
+
+DATA_PATH = os.path.abspath('data/')
+BELLY_RIVER_TRAIL = [os.path.join(DATA_PATH, 'belly_river_trail.json'),
+                     os.path.join(DATA_PATH, 'belly_river_terrain.json')]
+BELLY_RIVER_PARTY = os.path.join(DATA_PATH, 'belly_river_party.json')
+
+
+def main(args):
+    start_datetimes = [datetime.datetime.strptime(d, DATETIME_FORMAT) for d in args.start_date_time or list()]
+    start_time = datetime.datetime.strptime(args.start_time, '%H:%M')
+    for year, season in args.season or list():
+        start_datetimes += [day.replace(hour=start_time.hour, minute=start_time.minute)
+                            for day in season_dates(int(year), season)]
+    if not start_datetimes:
+        raise ValueError('ERROR - give at least one --start-date-time or --season')
+
+    # a resumed sweep carries on with the seed it was started with
+    seed = args.seed
+    if seed is None:
+        rows = read_sweep(args.output)
+        seed = int(rows[0]['seed']) if rows else new_seed()
+    print 'seed:', seed
+
+    cells = sweep_cells(start_datetimes,
+                        args.party_file or [BELLY_RIVER_PARTY],
+                        args.trail or [BELLY_RIVER_TRAIL],
+                        args.strategy or ['greatest need'],
+                        args.trials, seed, args.event_driven)
+
+    print 'sweeping', len(cells), 'cells of', args.trials, 'trials into', args.output
+    ran, skipped = run_sweep(cells, args.output, workers=args.workers)
+    print 'ran', ran, 'cells,', skipped, 'already done'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="run every combination of start date, party, trail and strategy")
+    parser.add_argument("--start-date-time", action='append', help="a start date YYYY-MM-DD hh:mm (repeatable)")
+    parser.add_argument("--season", nargs=2, action='append', metavar=('YEAR', 'SEASON'),
+                        help="start on every day of a season, e.g. 2016 summer (repeatable)")
+    parser.add_argument("--start-time", default='06:00', help="time of day hh:mm to start on the days of --season")
+    parser.add_argument("--party-file", action='append', help="party JSON file (repeatable; default Belly River)")
+    parser.add_argument("--trail", nargs=2, action='append', metavar=('TRAIL', 'TERRAIN'),
+                        help="trail and terrain JSON files (repeatable; default Belly River)")
+    parser.add_argument("--strategy", action='append', choices=sorted(STRATEGIES),
+                        help="strategy (repeatable; default greatest need)")
+    parser.add_argument("--trials", type=int, default=1000, help="number of trials per cell")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="base random seed shared by every cell; by default a resumed sweep's own")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--event-driven", action='store_true',
+                        help="cross runs of quiet miles in one step instead of one mile at a time")
+    parser.add_argument("--output", default='sweep.csv',
+                        help="results table, one row per cell; cells already in it are skipped")
+    args = parser.parse_args()
+    for option, value in (('--trials', args.trials), ('--workers', args.workers)):
+        if value < 1:
+            parser.error("argument " + option + ": must be at least 1, not " + str(value))
+    main(args)